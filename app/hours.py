@@ -1,6 +1,7 @@
 # Make it run from the examples directory
 import sys
 sys.path.append("../../liquer")
+sys.path.append("..")
 
 from liquer import *
 import liquer.ext.basic
@@ -8,8 +9,23 @@ import liquer.ext.meta
 import liquer.ext.lq_pandas
 from liquer.context import RecipeSpecStore
 from liquer.store import web_mount, mount, FileStore
-from flask import abort, redirect, url_for
+from flask import abort, redirect, url_for, request, jsonify, Response, send_from_directory
+from lqhours.store import open_store, assigned_rowids
+from lqhours.reports import load_hours, monthly_totals, monthly_pivot, user_totals, open_sessions, formatted_hours
+from lqhours.export import EXPORT_FORMATS, iter_export
+from lqhours.cache import HoursCache, hours_query
+from lqhours.changes import ChangeFeed
+from liquer.cache import set_cache
+from datetime import datetime, timezone
+import hashlib
+import gzip
+import json
 import webbrowser
+import os
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 ### Create Flask app and register LiQuer blueprint
 from flask import Flask
@@ -20,18 +36,334 @@ url_prefix='/liquer'
 app.register_blueprint(bp.app, url_prefix=url_prefix)
 
 mount("data")
+# Backend of the hours data: "sqlite" (default) or "json"
+hours_store = open_store("data", backend=os.environ.get("HOURS_STORE_BACKEND", "sqlite"))
+# Reports are cached per store version, states over the memory limit are spilled to disk
+report_cache = HoursCache(
+    hours_store.version_token,
+    spill_path="cache",
+    max_bytes=int(os.environ.get("HOURS_CACHE_MAX_BYTES", 256 * 1024 * 1024)),
+)
+set_cache(report_cache)
+hours_store.add_listener(lambda store, rows: report_cache.invalidate())
+# Changes pushed to the clients (/hours/api/changes), logged by the store backend
+change_feed = ChangeFeed(hours_store)
 
 @first_command(volatile=True)
 def hello():
     return "Hello"
 
+### Hours reports as LiQuer commands, e.g. hours_data/hours_year-2021/monthly_summary
+### The version parameter (see lqhours.cache.hours_query) only makes the cache keys unique.
+@first_command
+def hours_data(version=""):
+    """Stored hours as a dataframe (start and end as datetimes, computed hours)."""
+    return load_hours(hours_store)[["rowid", "name", "year", "month", "start", "end", "hours"]]
+
+@command
+def hours_year(df, year):
+    """Hours of a single year."""
+    return df.loc[df["year"] == int(year)]
+
+@command
+def monthly_summary(df):
+    """Total hours and number of records per name and month."""
+    return monthly_totals(df)
+
+@command
+def monthly_table(df):
+    """Table of hours with a row per name and a column per month."""
+    return monthly_pivot(df, names=hours_store.names() or None).reset_index()
+
+@command
+def user_summary(df):
+    """Total hours, number of records and first/last start per name."""
+    return user_totals(df)
+
+@command
+def open_session_list(df):
+    """Started and not stopped rows."""
+    return open_sessions(df)
+
+@command
+def with_hours_text(df, column="hours"):
+    """Add the hours formatted as in the app ("h:mm") as <column>_text."""
+    df = df.copy()
+    df[f"{column}_text"] = formatted_hours(df[column])
+    return df
+
+REPORTS = ["monthly_summary", "monthly_table", "user_summary", "open_session_list"]
+
 @app.route('/')
 @app.route('/index.html')
 def index():
     return redirect("/liquer/api/store/data/data/index.html")
 #    return open("../index.html").read()
 
+### Hours data, served in place of the LiQuer store files for compatibility
+COMPRESS_MIN_SIZE = 1024
+
+# ETag and compressed bodies of the latest payload of every kind (dataframe, names,
+# reports, ...): kind -> (store version, etag, {encoding: compressed body})
+encoded_payloads = {}
+
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=5)
+    return gzip.compress(data, compresslevel=6)
+
+def encoded_payload(data, key=None):
+    """ETag and the dictionary of compressed bodies of data.
+
+    With a key (kind, store version) they are computed once per store version and
+    only the latest version of every kind is kept.
+    """
+    if key is None:
+        return hashlib.sha256(data).hexdigest(), {}
+    kind, version = key
+    cached = encoded_payloads.get(kind)
+    if cached is None or cached[0] != version:
+        cached = encoded_payloads[kind] = (version, hashlib.sha256(data).hexdigest(), {})
+    return cached[1], cached[2]
+
+def json_response(data, key=None):
+    """JSON response with a strong ETag and Last-Modified, answering conditional
+    requests with 304 and compressing large payloads.
+
+    The compressed bodies are different representations, so the ETag gets the
+    content-coding as a suffix (e.g. "<sha256>-gzip"). The key (kind, store version)
+    of a payload read from the store lets it reuse the ETag and compressed bodies,
+    see encoded_payload; the version has to be read before the data.
+    """
+    tag, compressed = encoded_payload(data, key)
+    encoding = None
+    if len(data) >= COMPRESS_MIN_SIZE:
+        if brotli is not None and "br" in request.accept_encodings:
+            encoding = "br"
+        elif "gzip" in request.accept_encodings:
+            encoding = "gzip"
+    response = Response(data, mimetype="application/json")
+    response.set_etag(tag if encoding is None else f"{tag}-{encoding}")
+    response.last_modified = datetime.fromtimestamp(int(hours_store.modified), timezone.utc)
+    response.cache_control.no_cache = True
+    response.vary.add("Accept-Encoding")
+    response.make_conditional(request)
+    if response.status_code == 200 and encoding is not None:
+        if encoding not in compressed:
+            compressed[encoding] = compress(data, encoding)
+        response.set_data(compressed[encoding])
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+@app.route('/liquer/api/store/data/data/hours_dataframe.json', methods=['GET'])
+def hours_dataframe_get():
+    version = hours_store.version_token()
+    return json_response(hours_store.dataframe_bytes(), key=("dataframe", version))
+
+@app.route('/liquer/api/store/data/data/hours_dataframe.json', methods=['POST'])
+def hours_dataframe_post():
+    try:
+        hours_store.store_dataframe(request.get_json(force=True))
+    except ValueError as e:
+        return jsonify(dict(query="data/hours_dataframe.json", message=str(e), status="ERROR")), 400
+    return jsonify(dict(query="data/hours_dataframe.json", message="Data stored", status="OK"))
+
+@app.route('/liquer/api/store/data/data/hours_names.json', methods=['GET'])
+def hours_names_get():
+    version = hours_store.version_token()
+    return json_response(json.dumps(hours_store.names()).encode("utf-8"), key=("names", version))
+
+@app.route('/liquer/api/store/data/data/hours_names.json', methods=['POST'])
+def hours_names_post():
+    try:
+        hours_store.store_names(request.get_json(force=True))
+    except ValueError as e:
+        return jsonify(dict(query="data/hours_names.json", message=str(e), status="ERROR")), 400
+    return jsonify(dict(query="data/hours_names.json", message="Data stored", status="OK"))
+
+@app.route('/liquer/api/store/data/data/hours_columnar.json', methods=['GET'])
+def hours_columnar_get():
+    version = hours_store.version_token()
+    return json_response(hours_store.columnar_bytes(), key=("columnar", version))
+
+### Content-hashed assets of the built pages (hours_builder.py --static / --split-scripts).
+### The file names change with the content, so they can be cached forever.
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+def immutable_file(folder, name):
+    response = send_from_directory(os.path.join("data", folder), name, max_age=IMMUTABLE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.route('/liquer/api/store/data/data/static/<path:name>')
+def static_asset(name):
+    return immutable_file("static", name)
+
+@app.route('/liquer/api/store/data/data/js/<path:name>')
+def script_asset(name):
+    return immutable_file("js", name)
+
+@app.route('/hours/api/sync', methods=['POST'])
+def hours_sync():
+    """Accept new or changed rows (keyed by uid or rowid) and optionally the names.
+
+    Returns the rowids assigned to the rows with uid ({"rowids": {uid: rowid}}).
+    """
+    data = request.get_json(force=True)
+    try:
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object with rows and names")
+        if "names" in data:
+            hours_store.store_names(data["names"])
+        rows = hours_store.apply_rows(data.get("rows", []))
+    except ValueError as e:
+        return jsonify(dict(message=str(e), status="ERROR")), 400
+    return jsonify(dict(rows=len(rows), rowids=assigned_rowids(rows), message="Rows stored", status="OK"))
+
+@app.route('/hours/api/events', methods=['POST'])
+def hours_events():
+    """Bulk ingest of start/stop/edit events ({"events":[{"id":..., "type":..., "row":{...}}, ...]}).
+
+    The valid events are committed in a single transaction; events with already known
+    ids are skipped and the ids of invalid events are returned as rejected.
+    """
+    data = request.get_json(force=True)
+    try:
+        events = data.get("events") if isinstance(data, dict) else data
+        result = hours_store.apply_events(events)
+    except ValueError as e:
+        return jsonify(dict(message=str(e), status="ERROR")), 400
+    return jsonify(dict(result, message="Events stored", status="OK"))
+
+CHANGES_KEEPALIVE = 15
+
+@app.route('/hours/api/changes')
+def hours_changes():
+    """Server-sent events with the changes of the hours store.
+
+    The id of every event is its position in the change log of the store, shared
+    by all the worker processes; a reconnecting EventSource sends the last one in
+    the Last-Event-ID header and receives the events it has missed.
+    An open stream holds a server thread (see serve.py --threads); the hours
+    app itself uses the bounded requests of /hours/api/changes/poll.
+    """
+    position = request.headers.get("Last-Event-ID") or change_feed.position()
+
+    def stream(position):
+        yield f"retry: 3000\nid: {position}\n\n"
+        while True:
+            events, position = change_feed.changes(position, CHANGES_KEEPALIVE)
+            if not events:
+                yield ": keepalive\n\n"
+            for id, event, data in events:
+                yield f"id: {id}\nevent: {event}\ndata: {json.dumps(data)}\n\n"
+
+    return Response(
+        stream(position),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.route('/hours/api/changes/poll')
+def hours_changes_poll():
+    """Long-poll alternative of /hours/api/changes.
+
+    Returns the events after position (waiting up to timeout seconds for them)
+    and the position to use in the next request.
+    """
+    position = request.args.get("position") or change_feed.position()
+    timeout = min(request.args.get("timeout", 25, type=float), 60)
+    events, position = change_feed.changes(position, timeout)
+    return jsonify(
+        dict(
+            position=position,
+            events=[dict(id=id, type=type, data=data) for id, type, data in events],
+        )
+    )
+
+@app.route('/hours/api/columnar')
+def hours_columnar():
+    """Stored hours in the compact columnar format."""
+    version = hours_store.version_token()
+    return json_response(hours_store.columnar_bytes(), key=("columnar", version))
+
+@app.route('/hours/api/rows')
+def hours_rows():
+    """Server-side pagination, sorting and search for the hours table."""
+    sort_by = [c for c in request.args.get("sort_by", "").split(",") if c]
+    sort_desc = [d == "true" for d in request.args.get("sort_desc", "").split(",") if d]
+    filters = {}
+    if request.args.get("name"):
+        filters["name"] = request.args["name"]
+    return jsonify(
+        hours_store.query(
+            page=request.args.get("page", 1, type=int),
+            items_per_page=request.args.get("items_per_page", 10, type=int),
+            sort_by=sort_by,
+            sort_desc=sort_desc,
+            search=request.args.get("search"),
+            filters=filters,
+        )
+    )
+
+@app.route('/hours/api/overview')
+def hours_overview():
+    """Hours of the last months per name from the precomputed monthly index."""
+    last = request.args.get("last", 3, type=int)
+    return jsonify(hours_store.overview(last=last))
+
+@app.route('/hours/api/open_sessions')
+def hours_open_sessions():
+    """Open (started and not stopped) rows by name."""
+    return jsonify(hours_store.open_sessions())
+
+@app.route('/hours/api/export/<path:query>')
+def hours_export(query):
+    """Streamed download of a LiQuer query result (a dataframe) as csv, xlsx or parquet.
+
+    The last path element is the file name, e.g.
+    /hours/api/export/hours_data/monthly_summary/monthly.xlsx
+    """
+    query, _, filename = query.rpartition("/")
+    format = filename.rpartition(".")[2]
+    if not query or format not in EXPORT_FORMATS:
+        return jsonify(dict(query=query, message=f"Unsupported export: {filename}", status="ERROR")), 400
+    state = evaluate(hours_query(query, hours_store.version_token()))
+    if state.is_error:
+        return jsonify(dict(query=query, message=state.metadata.get("message"), status="ERROR")), 400
+    try:
+        chunks = iter_export(state.get(), format)
+    except ValueError as e:
+        return jsonify(dict(query=query, message=str(e), status="ERROR")), 400
+    except ImportError as e:
+        return jsonify(dict(query=query, message=str(e), status="ERROR")), 501
+    return Response(
+        chunks,
+        mimetype=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+@app.route('/hours/api/report/<report>')
+def hours_report(report):
+    """Cached report (one of REPORTS) as a list of records."""
+    if report not in REPORTS:
+        return jsonify(dict(message=f"Unknown report: {report}", status="ERROR")), 404
+    version = hours_store.version_token()
+    df = evaluate(hours_query(f"hours_data/{report}", version)).get()
+    return json_response(
+        df.to_json(orient="records", date_format="iso").encode("utf-8"), key=(f"report/{report}", version)
+    )
+
 
 if __name__ == '__main__':
-    webbrowser.open_new("http://127.0.0.1:5000")
-    app.run()
+    # Development server; see serve.py for serving with several worker processes
+    import argparse
+    parser = argparse.ArgumentParser(description="Hours app")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--headless", action="store_true", help="do not open a browser")
+    args = parser.parse_args()
+    if not args.headless:
+        webbrowser.open_new(f"http://{args.host}:{args.port}")
+    app.run(host=args.host, port=args.port, threaded=True)
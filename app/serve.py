@@ -0,0 +1,115 @@
+"""Production server of the hours app.
+
+Runs the Flask app of hours.py (with the LiQuer blueprint) under a multi-process
+WSGI server:
+
+    python serve.py --workers 4 --threads 16 --port 8000
+
+gunicorn (Linux, macOS) starts the given number of worker processes, each with
+its own HoursStore. The workers share the SQLite store (hours.sqlite in WAL mode),
+which is safe for concurrent writers; the json backend is only allowed with a
+single worker. Sending SIGHUP to the master process (the pid is written to
+--pid) reloads the workers gracefully: new workers are started with the current
+code while the old ones finish their requests.
+
+Where gunicorn is not available (Windows), waitress serves the app from a single
+process with --threads threads.
+
+Every open client waits for changes in a long-poll request (/hours/api/changes/poll,
+up to 25 seconds) holding a thread, so --threads times --workers should exceed the
+number of clients showing the hours at the same time.
+
+The server is headless by default; --open-browser opens the app in a browser.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import webbrowser
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_app():
+    """Import hours.py from the app folder (it uses paths relative to the folder)."""
+    os.chdir(APP_DIR)
+    if APP_DIR not in sys.path:
+        sys.path.insert(0, APP_DIR)
+    import hours
+
+    return hours.app
+
+
+def default_workers():
+    return multiprocessing.cpu_count() * 2 + 1
+
+
+def serve_gunicorn(args):
+    from gunicorn.app.base import BaseApplication
+
+    class HoursApplication(BaseApplication):
+        def load_config(self):
+            for key, value in dict(
+                bind=f"{args.host}:{args.port}",
+                workers=args.workers,
+                threads=args.threads,
+                worker_class="gthread",
+                timeout=args.timeout,
+                graceful_timeout=args.graceful_timeout,
+                pidfile=args.pid,
+                # Every worker must open its own store (and SQLite connections)
+                preload_app=False,
+                accesslog="-" if args.access_log else None,
+            ).items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return load_app()
+
+    HoursApplication().run()
+
+
+def serve_waitress(args):
+    import waitress
+
+    waitress.serve(load_app(), host=args.host, port=args.port, threads=args.threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the hours app")
+    parser.add_argument("--host", default="127.0.0.1", help="interface to bind")
+    parser.add_argument("--port", type=int, default=5000, help="port to bind")
+    parser.add_argument("-w", "--workers", type=int, default=default_workers(), help="number of worker processes (gunicorn)")
+    parser.add_argument("--threads", type=int, default=16, help="threads per worker (each waiting client holds one)")
+    parser.add_argument("--server", choices=["auto", "gunicorn", "waitress"], default="auto")
+    parser.add_argument("--backend", choices=["sqlite", "json"], default=os.environ.get("HOURS_STORE_BACKEND", "sqlite"), help="hours store backend")
+    parser.add_argument("--timeout", type=int, default=60, help="worker timeout in seconds")
+    parser.add_argument("--graceful-timeout", type=int, default=30, help="seconds for workers to finish requests on reload or stop")
+    parser.add_argument("--pid", default=None, help="pid file of the master process (send SIGHUP to reload)")
+    parser.add_argument("--access-log", action="store_true", help="log requests to stdout")
+    parser.add_argument("--open-browser", action="store_true", help="open the app in a browser")
+    args = parser.parse_args()
+
+    server = args.server
+    if server == "auto":
+        try:
+            import gunicorn
+            server = "gunicorn"
+        except ImportError:
+            server = "waitress"
+    if server == "waitress":
+        args.workers = 1
+    if args.backend == "json" and args.workers > 1:
+        parser.error("The json backend can not be shared by several workers, use --backend sqlite")
+    os.environ["HOURS_STORE_BACKEND"] = args.backend
+
+    if args.open_browser:
+        webbrowser.open_new(f"http://{args.host}:{args.port}")
+    if server == "gunicorn":
+        serve_gunicorn(args)
+    else:
+        serve_waitress(args)
+
+
+if __name__ == "__main__":
+    main()
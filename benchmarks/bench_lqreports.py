@@ -0,0 +1,161 @@
+"""Build-time benchmarks of lqreports rendering.
+
+Builds synthetic VuetifyDashboard documents and measures how rendering and
+serialization scale. Every measurement is printed as one JSON object per line:
+
+    python benchmarks/bench_lqreports.py --max-entries 1000000 --max-rows 10000000 > bench.jsonl
+
+Fields: benchmark, size, link_type, seconds, throughput (items per second),
+output_bytes and peak_memory_bytes (tracemalloc peak, only with --memory).
+"""
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import argparse
+import io
+import json
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from lqreports.constants import LinkType
+from lqreports.resource import FileResource, resource_cache, resources_description
+from lqreports.segments import Register, RenderContext, VuetifyDashboard
+
+
+def sizes(maximum, minimum=1000):
+    size = minimum
+    while size <= maximum:
+        yield size
+        size *= 10
+
+
+def dashboard():
+    r = Register()
+    doc = VuetifyDashboard(r, "Benchmark").with_navigation_drawer().with_app_bar().with_panels()
+    return r, doc
+
+
+def entries_document(n):
+    r, doc = dashboard()
+    panel = doc.panel("bench_panel")
+    for i in range(n):
+        panel.add(f"<v-row><v-col>Entry {i}</v-col></v-row>")
+    return doc
+
+
+def data_document(n):
+    r, doc = dashboard()
+    for i in range(n):
+        r.vuetify_script.add_data(f"value_{i}", i)
+    return doc
+
+
+def dataframe(n):
+    rng = np.random.default_rng(0)
+    names = np.array([f"user{i}" for i in range(50)])
+    start = pd.Timestamp("2021-01-01") + pd.to_timedelta(rng.integers(0, 3 * 365 * 24 * 3600, n), unit="s")
+    hours = rng.uniform(0, 12, n).round(3)
+    return pd.DataFrame(
+        dict(
+            name=names[rng.integers(0, len(names), n)],
+            year=start.year,
+            month=start.month,
+            start=start.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            end=(start + pd.to_timedelta(hours, unit="h")).strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+            hours=hours,
+        )
+    )
+
+
+def render_bytes(doc, link_type):
+    out = io.StringIO()
+    doc.write(out, RenderContext(link_type=link_type))
+    return len(out.getvalue())
+
+
+def measure(benchmark, size, link_type, function, memory):
+    if memory:
+        tracemalloc.start()
+    t0 = time.perf_counter()
+    output_bytes = function()
+    seconds = time.perf_counter() - t0
+    peak = None
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return dict(
+        benchmark=benchmark,
+        size=size,
+        link_type=None if link_type is None else link_type.name,
+        seconds=seconds,
+        throughput=size / seconds if seconds > 0 else None,
+        output_bytes=output_bytes,
+        peak_memory_bytes=peak,
+    )
+
+
+def benchmarks(max_entries, max_rows, memory):
+    link_types = [LinkType.LINK, LinkType.DATAURL]
+    for n in sizes(max_entries):
+        for link_type in link_types:
+            yield measure(
+                "segment_render", n, link_type,
+                lambda: render_bytes(entries_document(n), link_type), memory,
+            )
+        yield measure(
+            "add_data", n, LinkType.LINK,
+            lambda: render_bytes(data_document(n), LinkType.LINK), memory,
+        )
+    for n in sizes(max_rows):
+        df = dataframe(n)
+        for columnar in (False, True):
+
+            def run():
+                r, doc = dashboard()
+                doc.with_dataframe(df, columnar=columnar)
+                return render_bytes(doc, LinkType.LINK)
+
+            yield measure(
+                "with_dataframe_columnar" if columnar else "with_dataframe",
+                n, LinkType.LINK, run, memory,
+            )
+        del df
+    names = list(resources_description())
+    for cold in (True, False):
+        for link_type in link_types:
+
+            def run():
+                if cold:
+                    resource_cache().clear()
+                return sum(len(FileResource(name).link(link_type)) for name in names)
+
+            yield measure(
+                "file_resource_cold" if cold else "file_resource_warm",
+                len(names), link_type, run, memory,
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark lqreports rendering")
+    parser.add_argument("--max-entries", type=float, default=1e5, help="largest number of segment entries")
+    parser.add_argument("--max-rows", type=float, default=1e5, help="largest number of dataframe rows")
+    parser.add_argument("--memory", action="store_true", help="measure peak memory with tracemalloc (slower)")
+    parser.add_argument("--output", help="append the results to this file instead of stdout")
+    args = parser.parse_args()
+    out = sys.stdout if args.output is None else open(args.output, "a")
+    try:
+        for result in benchmarks(int(args.max_entries), int(args.max_rows), args.memory):
+            out.write(json.dumps(result) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
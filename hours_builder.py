@@ -1,11 +1,118 @@
 import sys
 sys.path.append("..")
 
-import matplotlib.pyplot as plt
 from lqreports.segments import *
+from lqhours.columnar import HOURS_ENCODINGS
 from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import os
+import shutil
+import tempfile
 
-def render(use_liquerstore, init_from_localstore, use_dataurl=False):
+VARIANTS = [
+    (False, False, "index.html"),
+    (True, False, "app/dist/data/index.html"),
+    (True, True, "app/dist/data/init.html"),
+    (False, False, "app/dist/data/localstore.html"),
+    (True, False, "app/data/index.html"),
+    (True, True, "app/data/init.html"),
+]
+
+# Seconds a long-poll request for changes (/hours/api/changes/poll) waits on the server.
+CHANGES_POLL_TIMEOUT = 25
+
+# Outbound queue of hours events in IndexedDB, shared by the page and the service worker.
+OUTBOX_JS = """
+    var HOURS_OUTBOX_DB = "hours3-outbox";
+    var HOURS_EVENTS_URL = "/hours/api/events";
+    var HOURS_SYNC_TAG = "hours-events";
+
+    function outbox_open(){
+      return new Promise(function (resolve, reject) {
+        var request = indexedDB.open(HOURS_OUTBOX_DB, 1);
+        request.onupgradeneeded = function () {
+          request.result.createObjectStore("events", {keyPath: "id"});
+        };
+        request.onsuccess = function () { resolve(request.result); };
+        request.onerror = function () { reject(request.error); };
+      });
+    }
+
+    function outbox_transaction(mode, action){
+      return outbox_open().then(function (db) {
+        return new Promise(function (resolve, reject) {
+          var tx = db.transaction("events", mode);
+          var result = action(tx.objectStore("events"));
+          tx.oncomplete = function () { resolve(result.result); };
+          tx.onerror = function () { reject(tx.error); };
+        });
+      });
+    }
+
+    function outbox_put(events){
+      return outbox_transaction("readwrite", function (store) {
+        events.forEach(function (event) { store.put(event); });
+        return {};
+      });
+    }
+
+    function outbox_all(){
+      return outbox_transaction("readonly", function (store) {
+        return store.getAll();
+      }).then(function (events) {
+        return events.sort(function (a, b) { return a.time - b.time; });
+      });
+    }
+
+    function outbox_delete(ids){
+      return outbox_transaction("readwrite", function (store) {
+        ids.forEach(function (id) { store.delete(id); });
+        return {};
+      });
+    }
+
+    function outbox_delete_rows(uids){
+      // Delete the queued events of rows synchronized otherwise (newer than the events)
+      var synced = {};
+      uids.forEach(function (uid) { synced[uid] = true; });
+      return outbox_all().then(function (events) {
+        var ids = events.filter(function (e) {
+          return e.row.uid && synced[e.row.uid]===true;
+        }).map(function (e) { return e.id; });
+        return ids.length ? outbox_delete(ids) : {};
+      });
+    }
+
+    function outbox_drain(){
+      return outbox_all().then(function (events) {
+        if (!events.length){
+          return 0;
+        }
+        return fetch(HOURS_EVENTS_URL, {
+          method: "POST",
+          headers: {"Content-Type": "application/json"},
+          body: JSON.stringify({events: events})
+        }).then(function (response) {
+          if (!response.ok){
+            throw new Error("Sending queued events failed: " + response.status);
+          }
+          return response.json();
+        }).then(function (result) {
+          // Rejected events would be rejected again, they are dropped with the sent ones
+          if (result.rejected && result.rejected.length){
+            console.log("Dropped rejected queued events", result.rejected, result.errors);
+          }
+          return outbox_delete(events.map(function (e) { return e.id; })).then(function () {
+            return events.length;
+          });
+        });
+      });
+    }
+"""
+
+def build_document(use_liquerstore, init_from_localstore):
     r = Register()
     doc = (
         VuetifyDashboard(r, "Working Hours Registration")
@@ -40,6 +147,8 @@ def render(use_liquerstore, init_from_localstore, use_dataurl=False):
       }
     }
     """)
+    if use_liquerstore:
+        r.before_init_vue.add(OUTBOX_JS)
     login_button="""<v-btn @click="show_panel('admin_panel')">Login</v-btn>"""
     doc.panel("home_panel", fluid=True).add("""
       <v-row v-for="n in names">
@@ -221,7 +330,7 @@ def render(use_liquerstore, init_from_localstore, use_dataurl=False):
         end=[""],
         hours=[""]))
  
-    doc.with_dataframe(df).with_panel_row_action("detail_panel")
+    doc.with_dataframe(df, columnar=True, encodings=HOURS_ENCODINGS).with_panel_row_action("detail_panel")
     #r.vuetify_script.add_data("myfilter",False)
     r.vuetify_script.add_method("update_user_filter", """
     function(){
@@ -313,58 +422,75 @@ def render(use_liquerstore, init_from_localstore, use_dataurl=False):
     # }
     # """)
 
-    r.vuetify_script.add_method("overview", """
-    function (name){
-        if (name==null){
-            name=this.username;
-        }
-        var data = this.dataframe.data.filter(function(x){
-            return (x.name==name); 
-        });
-        const to_key = function(x){
+    r.vuetify_script.add_method("overview_index", """
+    function (){
+        var index = {};
+        var data = this.dataframe.data;
+        for (var i=0; i<data.length; i++){
+            var x = data[i];
             var month = ""+x.month;
             if (month.length==1){
                 month="0"+month;
             }
-            return x.year+"_"+month;
-        };
-        var keys=data.map(to_key);
-        var ukeys = keys.filter(function(value,index,self){return self.indexOf(value)===index;});
-        ukeys.sort();
-        ukeys = ukeys.slice(Math.max(ukeys.length - 3, 0));
-        var hours = {};
-        var year = {};
-        var month = {};
-        for (var i=0; i<data.length; i++){
-            var x = data[i];
+            var key = x.year+"_"+month;
             var h = parseFloat(x.hours);
             if (!isFinite(h)){
                 h=0;
             }
-            var key = to_key(x);
-            year[key]=x.year;
-            month[key]=x.month;
-            if (key in hours){
-                hours[key]+=h;
+            if (!(x.name in index)){
+                index[x.name]={};
+            }
+            var months = index[x.name];
+            if (key in months){
+                months[key].hours+=h;
             }
             else{
-                hours[key]=h;
+                months[key]={name:x.name, year:x.year, month:x.month, hours:h};
             }
         }
-        var summary=ukeys.map(function(key){
-            return {name:name, year:year[key], month:month[key], hours:hours[key]};
-        });
-        return summary;
+        return index;
+    }
+    """)
+    r.vuetify_script.add_method("overview", """
+    function (name, index){
+        if (name==null){
+            name=this.username;
+        }
+        if (index==null){
+            index=this.overview_index();
+        }
+        var months = index[name] || {};
+        var ukeys = Object.keys(months);
+        ukeys.sort();
+        ukeys = ukeys.slice(Math.max(ukeys.length - 3, 0));
+        return ukeys.map(function(key){return months[key];});
     }
     """)
-    r.vuetify_script.add_computed("overview_all", """
+    if use_liquerstore:
+        r.vuetify_script.add_computed("overview_all", """
+        return this.overview_rows;
+        """)
+    else:
+        r.vuetify_script.add_computed("overview_all", """
+        var index = this.overview_index();
         var all=[];
         for (var i=0; i<this.names.length; i++){
-            var o = this.overview(this.names[i]);
+            var o = this.overview(this.names[i], index);
             Array.prototype.push.apply(all,o);
         }
         return all;
+        """)
+    r.vuetify_script.add_method("load_overview", """
+    function(){
+        this.$http.get("/hours/api/overview").then(function (response) {
+            response.json().then(function (data) {
+                this.overview_rows = data;
+            }.bind(this), function (reason) { this.error("Json error (reading overview)", reason); }.bind(this));
+        }.bind(this), function (reason) { this.error("Error reading overview", reason); }.bind(this));
+    }
     """)
+    if use_liquerstore:
+        r.vuetify_script.add_watch("visible_panel", "function(new_value,old_value){if (new_value=='overview_panel'){this.load_overview();}this.subscribe_changes();}")
 
     r.vuetify_script.add_method("start_working", """
     function (name){
@@ -375,7 +501,8 @@ def render(use_liquerstore, init_from_localstore, use_dataurl=False):
         var d = new Date();
         this.dataframe.data.push({
             index:this.dataframe.data.length,
-            rowid:this.dataframe.data.length,
+            rowid:this.new_rowid(),
+            uid:this.new_uid(),
             name:name,
             year:d.getFullYear(),
             month:d.getMonth()+1,
@@ -383,6 +510,8 @@ def render(use_liquerstore, init_from_localstore, use_dataurl=False):
             end:"",
             hours:"???",
         });
+        this.$set(this.open_index, name, this.dataframe.data.length-1);
+        this.mark_dirty(this.dataframe.data[this.dataframe.data.length-1]);
         this.store();
         this.update_user_filter();
     }
@@ -407,21 +536,36 @@ def render(use_liquerstore, init_from_localstore, use_dataurl=False):
         this.dataframe.data[index].end = d.toISOString();
         //this.dataframe.data[index].hours = Math.trunc(this.last_hours(name)*2)/2;
         this.dataframe.data[index].hours = this.last_hours(name).toString();
+        this.$delete(this.open_index, name);
+        this.mark_dirty(this.dataframe.data[index]);
         this.store();
         this.update_user_filter();
     }
     """)
 
+    r.vuetify_script.add_method("reindex", """
+    function (){
+        var open_index={};
+        var data=this.dataframe.data || [];
+        for(var i=0;i<data.length;i++){
+            if (data[i].end==""){
+                open_index[data[i].name]=i;
+            }
+            else{
+                delete open_index[data[i].name];
+            }
+        }
+        this.open_index=open_index;
+    }
+    """)
     r.vuetify_script.add_method("last_index", """
     function (name){
         if (name==null){
             name=this.username;
         }
-        var index=null;
-        for(var i=0;i<this.dataframe.data.length;i++){
-            if (this.dataframe.data[i].name==name){
-                index=i;
-            }
+        var index=this.open_index[name];
+        if (index==undefined){
+            return null;
         }
         return index;
     }
@@ -434,7 +578,7 @@ def render(use_liquerstore, init_from_localstore, use_dataurl=False):
             return "";
         }
         var h = Math.trunc(hours);
-        if (isNaN(h)){
+        if (!isFinite(h)){
             return "";
         }
         var m = Math.trunc(hours*60)-h*60;
@@ -450,7 +594,31 @@ def render(use_liquerstore, init_from_localstore, use_dataurl=False):
         var hh= ""+h+":"+m;
         return hh;
     }
+    """, hot=True)
+    r.vuetify_script.add_method("update_hours_cache", """
+    function (rows){
+        // Precompute the formatted hours of the rows (of all rows if not specified)
+        if (rows==undefined){
+            this.hours_cache = {};
+            rows = (this.dataframe && this.dataframe.data) || [];
+        }
+        for (var i=0; i<rows.length; i++){
+            var row = rows[i];
+            this.hours_cache[row.rowid] = {hours:row.hours, text:this.format_hours(row.hours)};
+        }
+    }
     """)
+    r.vuetify_script.add_method("hours_text", """
+    function (row){
+        // Formatted hours of a row from the cache (keyed by rowid); recomputed when the hours changed
+        var cached = this.hours_cache[row.rowid];
+        if (cached==undefined || cached.hours!==row.hours){
+            cached = {hours:row.hours, text:this.format_hours(row.hours)};
+            this.hours_cache[row.rowid] = cached;
+        }
+        return cached.text;
+    }
+    """, hot=True)
     r.vuetify_script.add_method("format_hours_min", """
     function (hours){
         console.log("format_hours_min",hours);
@@ -475,7 +643,7 @@ def render(use_liquerstore, init_from_localstore, use_dataurl=False):
         var hh= ""+h+" "+m+" minutes";
         return hh;
     }
-    """)
+    """, hot=True)
 
     r.vuetify_script.add_method("last_hours", """
     function (name){
@@ -505,7 +673,7 @@ def render(use_liquerstore, init_from_localstore, use_dataurl=False):
         }
         return false;
     }
-    """)
+    """, hot=True)
 
     r.vuetify_script.add_method("error", """
     function(message){
@@ -514,6 +682,34 @@ def render(use_liquerstore, init_from_localstore, use_dataurl=False):
     }
     """)
 
+    r.vuetify_script.add_method("new_uid", """
+    function(){
+        // Unique id of a new row, the row identity for the server (see lqhours.backends)
+        if (typeof crypto!="undefined" && crypto.randomUUID){
+            return crypto.randomUUID();
+        }
+        return Date.now().toString(36)+"-"+Math.random().toString(36).slice(2)+Math.random().toString(36).slice(2);
+    }
+    """)
+    if use_liquerstore:
+        r.vuetify_script.add_method("new_rowid", """
+        function(){
+            // Temporary (negative) rowid until the server assigns one, see assign_rowids
+            var rowid = 0;
+            var data = this.dataframe.data;
+            for (var i=0; i<data.length; i++){
+                rowid = Math.min(rowid, data[i].rowid);
+            }
+            return rowid-1;
+        }
+        """)
+    else:
+        r.vuetify_script.add_method("new_rowid", """
+        function(){
+            return this.dataframe.data.length;
+        }
+        """)
+
     if use_liquerstore:
         r.vuetify_script.add_method("store", """
         function(){
@@ -541,6 +737,7 @@ def render(use_liquerstore, init_from_localstore, use_dataurl=False):
     function(){
         localStorage.setItem("hours_dataframe",JSON.stringify(this.dataframe));
         localStorage.setItem("hours_names",JSON.stringify(this.names));       
+        this.dirty_rowids=[];
     }
     """)
     r.vuetify_script.add_method("restore_localstore", """
@@ -568,13 +765,305 @@ def render(use_liquerstore, init_from_localstore, use_dataurl=False):
     }
     """)
 
+    r.vuetify_script.add_method("mark_dirty", """
+    function(row){
+        // Client time of the last change, the server refuses older versions of the row
+        row.updated = Date.now();
+        delete this.hours_cache[row.rowid];
+        this.dataframe_update_search_index([row]);
+        if (this.dirty_rowids.indexOf(row.rowid)<0){
+            this.dirty_rowids.push(row.rowid);
+        }
+    }
+    """)
     r.vuetify_script.add_method("store_liquerstore", """
+    function(){
+      if (this.sync_full){
+        this.sync_full=false;
+        this.dirty_rowids=[];
+        this.names_synced=JSON.stringify(this.names);
+        this.store_liquerstore_full();
+        return;
+      }
+      var delta = {};
+      var names = JSON.stringify(this.names);
+      if (names!=this.names_synced){
+        delta.names = this.names;
+      }
+      if (this.dirty_rowids.length){
+        var dirty = {};
+        for (var i=0; i<this.dirty_rowids.length; i++){
+            dirty[this.dirty_rowids[i]]=true;
+        }
+        delta.rows = this.dataframe.data.filter(function(x){
+            return dirty[x.rowid]===true;
+        });
+      }
+      if (delta.names==undefined && delta.rows==undefined){
+        return;
+      }
+      var rowids = this.dirty_rowids;
+      this.dirty_rowids=[];
+      this.names_synced=names;
+      this.$http.post("/hours/api/sync", JSON.stringify(delta)).then(
+        function (response) {
+            console.log("posted delta",response);
+            this.assign_rowids((response.body || {}).rowids);
+            if (delta.rows!=undefined){
+              this.forget_queued_rows(delta.rows);
+            }
+            if (this.visible_panel=="overview_panel"){
+                this.load_overview();
+            }
+        }.bind(this),
+        function (reason) {
+          this.names_synced="";
+          this.error("Failed post data", reason);
+          if (delta.rows==undefined){
+            return;
+          }
+          this.queue_rows(delta.rows).catch(function (e) {
+            console.log("Queueing failed, keeping rows dirty",e);
+            for (var i=0; i<rowids.length; i++){
+              if (this.dirty_rowids.indexOf(rowids[i])<0){
+                  this.dirty_rowids.push(rowids[i]);
+              }
+            }
+          }.bind(this));
+        }.bind(this)
+      )
+    }
+    """)
+    r.vuetify_script.add_method("assign_rowids", """
+    function(rowids){
+      // Replace the temporary rowids of new rows by the rowids assigned by the server
+      if (rowids==undefined){
+        return;
+      }
+      var data = this.dataframe.data || [];
+      for (var i=0; i<data.length; i++){
+        var row = data[i];
+        var rowid = row.uid ? rowids[row.uid] : undefined;
+        if (rowid!=undefined && rowid!==row.rowid){
+          var k = this.dirty_rowids.indexOf(row.rowid);
+          if (k>=0){
+            this.dirty_rowids.splice(k, 1, rowid);
+          }
+          delete this.hours_cache[row.rowid];
+          row.rowid = rowid;
+        }
+      }
+    }
+    """)
+    r.vuetify_script.add_method("is_dirty_row", """
+    function(row){
+      // True if the local version of row (same uid or rowid) has unsent changes
+      if (this.dirty_rowids.length==0){
+        return false;
+      }
+      if (this.dirty_rowids.indexOf(row.rowid)>=0){
+        return true;
+      }
+      if (row.uid){
+        var data = this.dataframe.data || [];
+        for (var i=0; i<data.length; i++){
+          if (data[i].uid==row.uid){
+            return this.dirty_rowids.indexOf(data[i].rowid)>=0;
+          }
+        }
+      }
+      return false;
+    }
+    """)
+    r.vuetify_script.add_method("queue_rows", """
+    function(rows){
+      if (typeof indexedDB == "undefined"){
+        return Promise.reject("IndexedDB not available");
+      }
+      var now = Date.now();
+      var events = rows.map(function (row, i) {
+        return {
+          id: now.toString(36)+"-"+i+"-"+Math.random().toString(36).slice(2),
+          time: now+i/1000,
+          type: (row.end=="") ? "start" : "stop",
+          row: JSON.parse(JSON.stringify(row))
+        };
+      });
+      return outbox_put(events).then(function () {
+        this.request_outbox_sync();
+      }.bind(this));
+    }
+    """)
+    r.vuetify_script.add_method("forget_queued_rows", """
+    function(rows){
+      // Queued events of synchronized rows are older, sending them would revert the rows
+      if (typeof indexedDB == "undefined"){
+        return;
+      }
+      var uids = rows.filter(function (row) { return row.uid; }).map(function (row) { return row.uid; });
+      if (uids.length){
+        outbox_delete_rows(uids).catch(function (e) {
+          console.log("Deleting queued events failed",e);
+        });
+      }
+    }
+    """)
+    r.vuetify_script.add_method("request_outbox_sync", """
+    function(){
+      if ('serviceWorker' in navigator && 'SyncManager' in window){
+        navigator.serviceWorker.ready.then(function (registration) {
+          return registration.sync.register(HOURS_SYNC_TAG);
+        }).catch(function (e) {
+          console.log("Background sync registration failed",e);
+        });
+      }
+      else if (navigator.onLine){
+        this.drain_outbox();
+      }
+    }
+    """)
+    r.vuetify_script.add_method("drain_outbox", """
+    function(){
+      if (typeof indexedDB == "undefined"){
+        return;
+      }
+      outbox_drain().then(function (count) {
+        if (count){
+          console.log("Sent queued events",count);
+        }
+      }).catch(function (e) {
+        console.log("Sending queued events failed",e);
+      });
+    }
+    """)
+    r.vuetify_script.add_method("apply_outbox", """
+    function(){
+      if (typeof indexedDB == "undefined"){
+        return;
+      }
+      outbox_all().then(function (events) {
+        // Only queued rows newer than the loaded ones, the others are already stored
+        var updated = {};
+        (this.dataframe.data || []).forEach(function (row) {
+          if (row.uid && row.updated!=null){
+            updated[row.uid] = row.updated;
+          }
+        });
+        var stale = [];
+        var rows = [];
+        events.forEach(function (e) {
+          var time = e.row.uid ? updated[e.row.uid] : undefined;
+          var row_time = (e.row.updated!=null) ? e.row.updated : e.time;
+          if (time!=undefined && !(row_time > time)){
+            stale.push(e.id);
+          }
+          else{
+            rows.push(e.row);
+          }
+        });
+        if (rows.length){
+          this.patch_rows(rows);
+        }
+        if (stale.length){
+          return outbox_delete(stale);
+        }
+      }.bind(this)).catch(function (e) {
+        console.log("Reading queued events failed",e);
+      });
+    }
+    """)
+    r.vuetify_script.add_method("patch_rows", """
+    function(rows){
+      var data = this.dataframe.data;
+      if (data==undefined){
+        return;
+      }
+      // Rows are matched by uid (new rows have a temporary rowid, see new_rowid), then by rowid
+      var positions = {};
+      var uid_positions = {};
+      var patched = [];
+      for (var i=0; i<data.length; i++){
+        positions[data[i].rowid]=i;
+        if (data[i].uid){
+          uid_positions[data[i].uid]=i;
+        }
+      }
+      for (var i=0; i<rows.length; i++){
+        var row = rows[i];
+        var position = (row.uid && row.uid in uid_positions) ? uid_positions[row.uid] : positions[row.rowid];
+        if (position!=undefined){
+          if (row.rowid<0 && data[position].rowid>=0){
+            // a queued version of a row the server has numbered already
+            row = Object.assign({}, row, {rowid:data[position].rowid});
+          }
+          data.splice(position, 1, row);
+        }
+        else{
+          position = data.length;
+          data.push(row);
+        }
+        positions[row.rowid]=position;
+        if (row.uid){
+          uid_positions[row.uid]=position;
+        }
+        patched.push(row);
+      }
+      this.update_hours_cache(patched);
+      this.reindex();
+      this.update_user_filter();
+    }
+    """)
+    r.vuetify_script.add_method("apply_change", """
+    function(event){
+      if (event.type=="rows"){
+        // Rows edited here and not sent yet are kept
+        var rows = event.data.filter(function (row) {
+          return !this.is_dirty_row(row);
+        }.bind(this));
+        this.patch_rows(rows);
+        if (this.visible_panel=='overview_panel'){
+          this.load_overview();
+        }
+      }
+      if (event.type=="reload"){
+        if (this.dirty_rowids.length==0){
+          this.restore_liquerstore();
+        }
+      }
+    }
+    """)
+    r.vuetify_script.add_method("subscribe_changes", """
+    function(){
+      // Bounded long-poll requests instead of a stream holding a server thread;
+      // only while a panel showing the hours is visible.
+      // Polling starts from the position of the loaded rows (see restore_liquerstore).
+      var live = ["user_panel", "overview_panel", "detail_panel"];
+      if (this.changes_polling || this.changes_position==null
+          || live.indexOf(this.visible_panel)<0 || document.hidden){
+        return;
+      }
+      this.changes_polling=true;
+      var params = {timeout:%(timeout)d, position:this.changes_position};
+      this.$http.get("/hours/api/changes/poll", {params: params}).then(function (response) {
+        var result = response.body;
+        this.changes_polling=false;
+        this.changes_position = result.position;
+        result.events.forEach(this.apply_change);
+        this.subscribe_changes();
+      }.bind(this), function (reason) {
+        this.changes_polling=false;
+        setTimeout(this.subscribe_changes, 3000);
+      }.bind(this));
+    }
+    """ % dict(timeout=CHANGES_POLL_TIMEOUT))
+    r.vuetify_script.add_method("store_liquerstore_full", """
     function(){
       this.$http.post("/liquer/api/store/data/data/hours_dataframe.json", JSON.stringify(this.dataframe)).then(
         function (response) {
             console.log("posted hours dataframe",response);
         }.bind(this),
         function (reason) {
+          this.sync_full=true;
           this.error("Failed post data", reason);
         }.bind(this)
       )
@@ -583,39 +1072,85 @@ def render(use_liquerstore, init_from_localstore, use_dataurl=False):
             console.log("posted names",response);
         }.bind(this),
         function (reason) {
+          this.sync_full=true;
           this.error("Failed post data", reason);
         }.bind(this)
       )
     }
     """)
-    r.vuetify_script.add_method("restore_liquerstore", """
-    function(){
-        this.$http.get("/liquer/api/store/data/data/hours_dataframe.json").then(function (response) {
-            response.json().then(function (data) {
-                if (data.status!=undefined){
-                    console.log("Error reading dataframe",data.message);
-                    console.log("Data:",data);
-                    this.dataframe={};
-                }
-                else{
-                    this.dataframe = data;
-                    console.log("Dataframe reading OK",data);
-                }
-            }.bind(this), function (reason) { this.error("Json error (reading dataframe)", reason); }.bind(this));
-        }.bind(this), function (reason) { this.error("Error reading dataframe", reason); }.bind(this));
-        this.$http.get("/liquer/api/store/data/data/hours_names.json").then(function (response) {
+    r.vuetify_script.add_method("cached_get", """
+    function(url, what, success){
+        var key = "hours_cache:"+url;
+        var cached = null;
+        try{
+            cached = JSON.parse(localStorage.getItem(key));
+        }
+        catch(e){
+            cached = null;
+        }
+        var headers = {};
+        if (cached!=null && cached.etag){
+            headers["If-None-Match"] = cached.etag;
+        }
+        this.$http.get(url, {headers:headers}).then(function (response) {
+            if (response.status==304 && cached!=null){
+                success(cached.data);
+                return;
+            }
+            var etag = response.headers.get("ETag");
             response.json().then(function (data) {
-                if (data.status!=undefined){
-                    console.log("Error reading names",data.message);
-                    console.log("Data:",data);
-                    this.names=[];
+                if (etag && data.status==undefined){
+                    try{
+                        localStorage.setItem(key, JSON.stringify({etag:etag, data:data}));
+                    }
+                    catch(e){
+                        localStorage.removeItem(key);
+                    }
                 }
-                else{
-                    this.names = data;
-                    console.log("Names reading OK",data);
+                success(data);
+            }.bind(this), function (reason) { this.error("Json error (reading "+what+")", reason); }.bind(this));
+        }.bind(this), function (response) {
+            if (response.status==304 && cached!=null){
+                success(cached.data);
+                return;
+            }
+            this.error("Error reading "+what, response);
+        }.bind(this));
+    }
+    """)
+    r.vuetify_script.add_method("restore_liquerstore", """
+    function(){
+        this.cached_get("/hours/api/columnar", "dataframe", function (data) {
+            if (data.status!=undefined){
+                console.log("Error reading dataframe",data.message);
+                console.log("Data:",data);
+                this.dataframe={};
+            }
+            else{
+                var dataframe = {data:lqreports_decode_columnar(data)};
+                if (data.schema!=undefined){
+                    dataframe.schema=data.schema;
                 }
-            }.bind(this), function (reason) { this.error("Json error (reading names)", reason); }.bind(this));
-        }.bind(this), function (reason) { this.error("Error reading names", reason); }.bind(this));
+                this.dataframe = dataframe;
+                this.dirty_rowids = [];
+                this.apply_outbox();
+                this.changes_position = (data.position==undefined) ? null : data.position;
+                this.subscribe_changes();
+                console.log("Dataframe reading OK",data);
+            }
+        }.bind(this));
+        this.cached_get("/liquer/api/store/data/data/hours_names.json", "names", function (data) {
+            if (data.status!=undefined){
+                console.log("Error reading names",data.message);
+                console.log("Data:",data);
+                this.names=[];
+            }
+            else{
+                this.names = data;
+                this.names_synced = JSON.stringify(data);
+                console.log("Names reading OK",data);
+            }
+        }.bind(this));
     }
     """)
 
@@ -625,6 +1160,7 @@ def render(use_liquerstore, init_from_localstore, use_dataurl=False):
             this.dataframe={data:[]};
             this.names=[];
             this.confirm_erase=false;
+            this.sync_full=true;
             this.store();
         }
     }
@@ -643,6 +1179,7 @@ def render(use_liquerstore, init_from_localstore, use_dataurl=False):
             var dataframe = JSON.parse(this.dataframe_json);
             if (dataframe!=null){
                 this.dataframe=dataframe;
+                this.sync_full=true;
             }
             else{
                 this.json_error="Set JSON failed: dataframe is null";
@@ -662,9 +1199,10 @@ def render(use_liquerstore, init_from_localstore, use_dataurl=False):
     }
     """)
 
+    r.vuetify_script.add_watch("dataframe", "function(new_value,old_value){this.reindex();this.update_hours_cache();}")
     r.vuetify_script.add_watch("username", "function(new_value,old_value){console.log('watch',new_value,old_value);this.update_user_filter();}")
 
-    r.user_panel.dataframe_view()
+    r.user_panel.dataframe_view(virtual=True)
     r.detail_panel.add("""{{selected_row}}""")
     r.detail_panel.add("""<h2>Selected</h2>{{selected_row}}""")
     r.detail_panel.row_detail()
@@ -687,6 +1225,13 @@ def render(use_liquerstore, init_from_localstore, use_dataurl=False):
     r.vuetify_script.add_data("dataframe_json", "")
     r.vuetify_script.add_data("names_json", "")
     r.vuetify_script.add_data("json_error", "")
+    r.vuetify_script.add_data("overview_rows", [])
+    r.vuetify_script.add_data("open_index", {})
+    r.vuetify_script.add_data("dirty_rowids", [])
+    r.vuetify_script.add_data("names_synced", "")
+    r.vuetify_script.add_data("sync_full", False)
+    r.vuetify_script.add_data("changes_polling", False)
+    r.vuetify_script.add_data("changes_position", None)
 
     # r.vuetify_script.add_method("test_store", """
     # function(){
@@ -722,6 +1267,16 @@ def render(use_liquerstore, init_from_localstore, use_dataurl=False):
     }
     """)
 
+    r.vuetify_script.add_created("""
+        this.reindex();
+        this.update_hours_cache();
+        """)
+    if use_liquerstore:
+        r.vuetify_script.add_created("""
+        window.addEventListener('online', function(){this.drain_outbox();}.bind(this));
+        document.addEventListener('visibilitychange', function(){this.subscribe_changes();}.bind(this));
+        this.drain_outbox();
+        """)
     if init_from_localstore:
         r.vuetify_script.add_created("""
         console.log('Start Hours');
@@ -735,7 +1290,11 @@ def render(use_liquerstore, init_from_localstore, use_dataurl=False):
 
 
     r.vuetify_script.add_method("save", """
-    function(){
+    function(item){
+        if (item!=undefined){
+            this.mark_dirty(item);
+            this.store();
+        }
         this.snack = true
         this.snackColor = 'success'
         this.snackText = 'Data saved'
@@ -761,21 +1320,295 @@ def render(use_liquerstore, init_from_localstore, use_dataurl=False):
     }
     """)
 
+    return doc
+
+def render_context(use_dataurl=False, **options):
+    """Render context; options are passed to RenderContext
+    (link_type, split_scripts, minify, strip_console, production).
+    """
     if use_dataurl:
-        return (doc.render(RenderContext(link_type=LinkType.DATAURL)))
+        options["link_type"] = LinkType.DATAURL
+    return RenderContext(**options)
+
+def render(use_liquerstore, init_from_localstore, use_dataurl=False, **options):
+    doc = build_document(use_liquerstore, init_from_localstore)
+    return doc.render(render_context(use_dataurl, **options))
+
+def write(path, use_liquerstore, init_from_localstore, use_dataurl=False, **options):
+    doc = build_document(use_liquerstore, init_from_localstore)
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    context = render_context(use_dataurl, **options)
+    with open(p, "w") as f:
+        doc.write(f, context)
+    context.write_assets(p.parent)
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def build_variant(use_liquerstore, init_from_localstore, paths, use_dataurl=False, options=None):
+    """Render one variant once and write it to those paths where the content changed.
+    Assets produced by the rendering (e.g. split scripts) are written next to each path.
+    Returns the sha256 of the content, the list of paths written and a dictionary
+    of the asset paths (relative to the page) with their sha256.
+    """
+    doc = build_document(use_liquerstore, init_from_localstore)
+    context = render_context(use_dataurl, **(options or {}))
+    fd, tmp = tempfile.mkstemp(suffix=".html")
+    try:
+        h = hashlib.sha256()
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for chunk in doc.iter_render(context):
+                f.write(chunk)
+                h.update(chunk.encode("utf-8"))
+        digest = h.hexdigest()
+        written = []
+        for path in paths:
+            p = Path(path)
+            written.extend(context.write_assets(p.parent))
+            if p.exists() and file_hash(p) == digest:
+                continue
+            p.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(tmp, p)
+            written.append(path)
+        assets = {
+            path: hashlib.sha256(data).hexdigest() for path, data in context.assets.items()
+        }
+        return digest, written, assets
+    finally:
+        os.remove(tmp)
+
+def write_if_changed(path, text):
+    """Write text to path unless the file already has the same content.
+    Returns True if the file was written.
+    """
+    p = Path(path)
+    data = text.encode("utf-8")
+    if p.exists() and file_hash(p) == hashlib.sha256(data).hexdigest():
+        return False
+    p.parent.mkdir(parents=True, exist_ok=True)
+    p.write_bytes(data)
+    return True
+
+DATA_URLS = [
+    "/hours/api/columnar",
+    "/hours/api/overview",
+    "/liquer/api/store/data/data/hours_dataframe.json",
+    "/liquer/api/store/data/data/hours_names.json",
+    "/liquer/api/store/data/data/hours_columnar.json",
+]
+
+SERVICE_WORKER = """var CACHE_PREFIX = "hours3-";
+var CACHE_NAME = CACHE_PREFIX + "%(version)s";
+var DATA_CACHE_NAME = CACHE_PREFIX + "data";
+var PRECACHE = %(precache)s;
+var DATA_URLS = %(data_urls)s;
+%(outbox)s
+self.addEventListener("sync", function (event) {
+  if (event.tag == HOURS_SYNC_TAG) {
+    event.waitUntil(outbox_drain());
+  }
+});
+
+self.addEventListener("install", function (event) {
+  event.waitUntil(
+    caches.open(CACHE_NAME).then(function (cache) {
+      return Promise.all(PRECACHE.map(function (entry) {
+        var url = new URL(entry.url, self.location);
+        var request = new Request(url.href, {mode: url.origin == self.location.origin ? "same-origin" : "no-cors"});
+        return fetch(request).then(function (response) {
+          return cache.put(url.href, response);
+        });
+      }));
+    }).then(function () {
+      return self.skipWaiting();
+    })
+  );
+});
+
+self.addEventListener("activate", function (event) {
+  event.waitUntil(
+    caches.keys().then(function (keys) {
+      return Promise.all(keys.filter(function (key) {
+        return key.indexOf(CACHE_PREFIX) == 0 && key != CACHE_NAME && key != DATA_CACHE_NAME;
+      }).map(function (key) {
+        return caches.delete(key);
+      }));
+    }).then(function () {
+      return self.clients.claim();
+    })
+  );
+});
+
+function is_data(url) {
+  return url.origin == self.location.origin && DATA_URLS.indexOf(url.pathname) >= 0;
+}
+
+// Live data: from the network (conditional requests reach the server and may
+// get 304), the last 200 response is kept for offline use only.
+function network_first(event) {
+  return caches.open(DATA_CACHE_NAME).then(function (cache) {
+    return fetch(event.request).then(function (response) {
+      if (response.status == 200) {
+        cache.put(event.request, response.clone());
+      }
+      return response;
+    }, function (reason) {
+      return cache.match(event.request).then(function (cached) {
+        if (cached) {
+          return cached;
+        }
+        throw reason;
+      });
+    });
+  });
+}
+
+self.addEventListener("fetch", function (event) {
+  if (event.request.method != "GET") {
+    return;
+  }
+  var url = new URL(event.request.url);
+  if (url.pathname.indexOf("/hours/api/changes") == 0) {
+    return;  // live change stream, never cached
+  }
+  if (is_data(url)) {
+    event.respondWith(network_first(event));
+    return;
+  }
+  event.respondWith(
+    caches.open(CACHE_NAME).then(function (cache) {
+      return cache.match(event.request).then(function (response) {
+        return response || fetch(event.request);
+      });
+    })
+  );
+});
+"""
+
+def resource_manifest(use_dataurl=False, use_static=False):
+    """Precache entries (url and sha256 of the content) of the resources linked
+    by the document; empty when the resources are embedded as data URLs.
+    With use_static only the external resources are listed - the others are
+    copied to the static folder and precached as assets of the pages.
+    """
+    if use_dataurl:
+        return []
+    doc = build_document(False, False)
+    manifest = []
+    for resource in doc.iter_resources():
+        if use_static and not resource.external:
+            continue
+        url = resource.link(LinkType.LINK)
+        if resource.data is None:
+            digest = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        else:
+            digest = hashlib.sha256(resource.data).hexdigest()
+        entry = dict(url=url, hash=digest)
+        if entry not in manifest:
+            manifest.append(entry)
+    return manifest
+
+def service_worker(precache):
+    """Service worker source with the given precache manifest.
+    The cache name contains a hash of the manifest, so any content change
+    installs a fresh cache and the old ones are evicted on activate.
+    """
+    version = hashlib.sha256(json.dumps(precache).encode("utf-8")).hexdigest()[:16]
+    return SERVICE_WORKER % dict(
+        version=version,
+        precache=json.dumps(precache, indent=2),
+        data_urls=json.dumps(DATA_URLS),
+        outbox=OUTBOX_JS,
+    )
+
+def write_service_workers(digests, use_dataurl=False, assets=None, use_static=False):
+    """Write serviceworker.js next to the built pages, precaching the pages
+    in the same folder, their assets (dictionary page path -> {asset path: sha256})
+    and all the resources.
+    Returns the list of paths written.
+    """
+    resources = resource_manifest(use_dataurl, use_static)
+    folders = {}
+    for path, digest in digests.items():
+        p = Path(path)
+        pages = folders.setdefault(p.parent, [])
+        pages.append(dict(url=p.name, hash=digest))
+        for url, asset_digest in (assets or {}).get(path, {}).items():
+            entry = dict(url=url, hash=asset_digest)
+            if entry not in pages:
+                pages.append(entry)
+    written = []
+    for folder, pages in folders.items():
+        path = folder / "serviceworker.js"
+        if write_if_changed(path, service_worker(sorted(pages, key=lambda e: e["url"]) + resources)):
+            written.append(str(path))
+    return written
+
+def _build_job(job):
+    return build_variant(*job)
+
+def build(variants=VARIANTS, jobs=1, use_dataurl=False, **options):
+    """Build all variants and their service workers; variants sharing the same options
+    are rendered only once. With jobs>1 the variants are rendered concurrently
+    in a process pool. options are passed to the RenderContext (see render_context).
+    Returns the list of paths written.
+    """
+    groups = {}
+    for use_liquerstore, init_from_localstore, path in variants:
+        groups.setdefault((use_liquerstore, init_from_localstore), []).append(path)
+    tasks = [(ls, init, paths, use_dataurl, options) for (ls, init), paths in groups.items()]
+    if jobs > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            results = list(executor.map(_build_job, tasks))
     else:
-        return (doc.render(RenderContext()))
+        results = [_build_job(task) for task in tasks]
+    digests = {}
+    assets = {}
+    for (digest, _, variant_assets), (_, _, paths, _, _) in zip(results, tasks):
+        for path in paths:
+            digests[path] = digest
+            assets[path] = variant_assets
+    written = [path for _, paths, _ in results for path in paths]
+    use_static = options.get("link_type") == LinkType.STATIC
+    return written + write_service_workers(digests, use_dataurl, assets, use_static)
 
 if __name__ == '__main__':
-    for use_liquerstore, init_from_localstore, path in [
-        (False, False,"index.html"),
-        (True, False,"app/dist/data/index.html"),
-        (True, True, "app/dist/data/init.html"),
-        (False, False, "app/dist/data/localstore.html"),
-        (True, False,"app/data/index.html"),
-        (True, True, "app/data/init.html"),]:
-        (False, False, "app/data/localstore.html"),
-        p = Path(path)
-        p.parent.mkdir(parents=True, exist_ok=True)
-        with open(path,"w") as f:
-            f.write(render(use_liquerstore, init_from_localstore))
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the hours registration app")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=1,
+        help="number of processes rendering the variants concurrently (0: one per CPU)",
+    )
+    parser.add_argument("--dataurl", action="store_true", help="embed resources as data URLs")
+    parser.add_argument(
+        "--static", action="store_true",
+        help="copy resources into a static folder next to each page under content-hashed names",
+    )
+    parser.add_argument(
+        "--split-scripts", action="store_true",
+        help="emit the app code as a separate content-hashed js file next to each page",
+    )
+    parser.add_argument("--minify", action="store_true", help="minify the generated javascript")
+    parser.add_argument("--strip-console", action="store_true", help="remove console.log calls from the generated javascript")
+    parser.add_argument(
+        "--production", action="store_true",
+        help="production profile: minified javascript, hot methods without logging",
+    )
+    args = parser.parse_args()
+    jobs = os.cpu_count() if args.jobs == 0 else args.jobs
+    options = dict(
+        split_scripts=args.split_scripts,
+        minify=args.minify or args.production,
+        strip_console=args.strip_console,
+        production=args.production,
+    )
+    if args.static:
+        options["link_type"] = LinkType.STATIC
+    for path in build(jobs=jobs, use_dataurl=args.dataurl, **options):
+        print(f"Written {path}")
@@ -0,0 +1,612 @@
+"""Persistent backends of the HoursStore.
+
+A backend stores the hours dataframe (pandas table orientation: a dictionary with
+"data" - the list of rows - and optionally "schema") and the list of names:
+
+- load() returns the stored dataframe,
+- version() returns a token that changes whenever the stored rows change,
+- write_rows(rows, apply) persists inserted or updated rows; apply(rows) is called
+  with the rows as written (with the assigned rowids, see below) and returns the
+  complete dataframe after the update (for backends that can only write it as a whole).
+  Returns a tuple (version before the write, version after the write),
+- write_events(event_ids, rows, apply) persists the rows of events whose ids were not
+  seen before, together with the ids; apply(rows) is called like in write_rows with
+  the rows of the new events. Returns a tuple (version before, version after,
+  number of new events),
+- write_dataframe(dataframe) replaces all rows,
+- load_names() and write_names(names) read and write the names,
+- position(version) returns the position in the change log of the stored state with
+  the given version (a string),
+- changes_since(position) returns the changes written after position as a list of
+  (position, rows) - rows are the written rows, None if all rows or the names were
+  replaced - or None if the log does not reach back to position.
+
+The change log lets a client (waiting on any worker process, see lqhours.changes)
+patch its copy of the rows instead of reloading them. Only the last CHANGES_KEPT
+changes are kept.
+
+Row identity: rows created by the clients carry a uid (a string unique per row,
+generated by the client) and a temporary rowid, which is only meaningful to the
+client. The backend assigns the rowid of a row with a new uid in the write
+transaction, so clients writing concurrently (or replaying rows queued offline)
+never overwrite each other's rows. Rows with a known uid keep their stored rowid;
+rows without uid (older clients) are identified by their rowid.
+
+Row age: rows may carry the client time of their last change ("updated", in
+milliseconds). write_rows and write_events skip rows older than the stored ones, so
+a snapshot queued offline does not revert a change synchronized after it.
+"""
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from collections import deque
+from pathlib import Path
+
+DATAFRAME_FILENAME = "hours_dataframe.json"
+NAMES_FILENAME = "hours_names.json"
+EVENTS_FILENAME = "hours_events.jsonl"
+COLUMNAR_FILENAME = "hours_columnar.json"
+SQLITE_FILENAME = "hours.sqlite"
+EVENT_IDS_FILENAME = "hours_event_ids.txt"
+SQLITE_MAX_PARAMETERS = 500
+CHANGES_KEPT = 1000
+
+
+def empty_dataframe():
+    return dict(data=[])
+
+
+def write_atomic(path, data):
+    """Write bytes to path so that readers never see a partially written file."""
+    path = Path(path)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def validate_row(row):
+    if not isinstance(row, dict):
+        raise ValueError(f"Row must be an object, got {type(row).__name__}")
+    rowid = row.get("rowid")
+    if not isinstance(rowid, int) or isinstance(rowid, bool):
+        raise ValueError(f"Row without a valid integer rowid: {row}")
+    uid = row.get("uid")
+    if uid is not None and (not isinstance(uid, str) or uid == ""):
+        raise ValueError(f"Row with an invalid uid: {row}")
+    if uid is None and rowid < 0:
+        raise ValueError(f"Row without uid must have a non-negative rowid: {row}")
+    updated = row.get("updated")
+    if updated is not None and (not isinstance(updated, (int, float)) or isinstance(updated, bool)):
+        raise ValueError(f"Row with an invalid update time: {row}")
+    return row
+
+
+def assign_rowids(rows, known, next_rowid):
+    """Rows with the rowids assigned by the store.
+
+    known is a dictionary uid -> stored rowid (updated with the new rows), next_rowid
+    is the first free rowid. A row with a known uid gets the stored rowid, a row with
+    a new uid the next free rowid; rows without uid are returned unchanged.
+    Returns the rows and the next free rowid.
+    """
+    result = []
+    for row in rows:
+        uid = row.get("uid")
+        if uid is not None:
+            rowid = known.get(uid)
+            if rowid is None:
+                rowid = known[uid] = next_rowid
+                next_rowid += 1
+            if rowid != row["rowid"]:
+                row = dict(row, rowid=rowid)
+        result.append(row)
+    return result, next_rowid
+
+
+def newer_rows(rows, stored):
+    """Rows not older than the stored rows with the same rowid.
+
+    stored is a dictionary rowid -> update time of the stored row (updated with the
+    returned rows). Rows without update time, or replacing a row without one, are
+    always returned.
+    """
+    result = []
+    for row in rows:
+        updated = row.get("updated")
+        if updated is not None:
+            previous = stored.get(row["rowid"])
+            if previous is not None and updated < previous:
+                continue
+            stored[row["rowid"]] = updated
+        result.append(row)
+    return result
+
+
+def next_free_rowid(rows):
+    return max([0] + [row["rowid"] + 1 for row in rows])
+
+
+def renumber_dataframe(dataframe):
+    """Dataframe with rowids assigned to rows with uid and a negative (temporary) rowid,
+    e.g. when a client replaces all rows with its local state.
+    """
+    rows = [validate_row(row) for row in dataframe["data"]]
+    stored = [row for row in rows if row["rowid"] >= 0]
+    known = {row["uid"]: row["rowid"] for row in stored if row.get("uid") is not None}
+    rows, _ = assign_rowids(rows, known, next_free_rowid(stored))
+    return dict(dataframe, data=rows)
+
+
+def read_dataframe_file(path):
+    if not Path(path).exists():
+        return empty_dataframe()
+    with open(path, "rb") as f:
+        dataframe = json.loads(f.read())
+    if not isinstance(dataframe, dict) or not isinstance(dataframe.get("data"), list):
+        return empty_dataframe()
+    return dataframe
+
+
+class HoursBackend(object):
+    def load(self):
+        raise NotImplementedError()
+
+    def version(self):
+        raise NotImplementedError()
+
+    def write_rows(self, rows, apply):
+        raise NotImplementedError()
+
+    def write_dataframe(self, dataframe):
+        raise NotImplementedError()
+
+    def write_events(self, event_ids, rows, apply):
+        raise NotImplementedError()
+
+    def load_names(self):
+        raise NotImplementedError()
+
+    def write_names(self, names):
+        raise NotImplementedError()
+
+    def position(self, version):
+        raise NotImplementedError()
+
+    def changes_since(self, position):
+        raise NotImplementedError()
+
+
+class JsonFileBackend(HoursBackend):
+    """Rows in hours_dataframe.json (plus hours_columnar.json) in a folder.
+
+    Written rows are first appended to an event log, which is compacted into the
+    dataframe file and removed. Events left by an interrupted compaction are applied
+    on load.
+
+    The backend is used by a single process, so the change log is kept in memory.
+    A change of the files by somebody else is logged as a reload.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self._uids = {}
+        self._updated = {}
+        self._next_rowid = 0
+        self._uids_version = None
+        self._log_id = uuid.uuid4().hex[:8]
+        self._log = deque(maxlen=CHANGES_KEPT)
+        self._log_number = 0
+        self._log_version = self.version()
+
+    @property
+    def dataframe_path(self):
+        return self.path / DATAFRAME_FILENAME
+
+    @property
+    def names_path(self):
+        return self.path / NAMES_FILENAME
+
+    @property
+    def columnar_path(self):
+        return self.path / COLUMNAR_FILENAME
+
+    @property
+    def events_path(self):
+        return self.path / EVENTS_FILENAME
+
+    @property
+    def event_ids_path(self):
+        return self.path / EVENT_IDS_FILENAME
+
+    def version(self):
+        try:
+            st = os.stat(self.dataframe_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def load(self):
+        dataframe = read_dataframe_file(self.dataframe_path)
+        if self.events_path.exists():
+            positions = {row.get("rowid"): i for i, row in enumerate(dataframe["data"])}
+            with open(self.events_path) as f:
+                for line in f:
+                    try:
+                        row = validate_row(json.loads(line))
+                    except ValueError:
+                        continue
+                    position = positions.get(row["rowid"])
+                    if position is None:
+                        positions[row["rowid"]] = len(dataframe["data"])
+                        dataframe["data"].append(row)
+                    else:
+                        dataframe["data"][position] = row
+            self._write_files(dataframe)
+        self._index_uids(dataframe["data"])
+        return dataframe
+
+    def _index_uids(self, rows):
+        self._uids = {row["uid"]: row["rowid"] for row in rows if row.get("uid") is not None}
+        self._updated = {
+            row.get("rowid"): row["updated"] for row in rows if row.get("updated") is not None
+        }
+        self._next_rowid = next_free_rowid(row for row in rows if isinstance(row.get("rowid"), int))
+        self._uids_version = self.version()
+
+    def _assign_rowids(self, rows):
+        if self._uids_version is None or self._uids_version != self.version():
+            self.load()
+        rows, self._next_rowid = assign_rowids(rows, self._uids, self._next_rowid)
+        self._next_rowid = max([self._next_rowid] + [row["rowid"] + 1 for row in rows])
+        return newer_rows(rows, self._updated)
+
+    def write_rows(self, rows, apply):
+        previous = self.version()
+        rows = self._assign_rowids(rows)
+        dataframe = apply(rows)
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.events_path, "a") as f:
+            for row in rows:
+                f.write(json.dumps(row) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._write_files(dataframe)
+        self._uids_version = self.version()
+        self._log_change(rows)
+        return previous, self._uids_version
+
+    def write_events(self, event_ids, rows, apply):
+        seen = set()
+        if self.event_ids_path.exists():
+            with open(self.event_ids_path) as f:
+                seen = set(f.read().splitlines())
+        new = [(event_id, row) for event_id, row in zip(event_ids, rows) if event_id not in seen]
+        if not new:
+            version = self.version()
+            return version, version, 0
+        previous, version = self.write_rows([row for _, row in new], apply)
+        with open(self.event_ids_path, "a") as f:
+            f.write("".join(f"{event_id}\n" for event_id, _ in new))
+            f.flush()
+            os.fsync(f.fileno())
+        return previous, version, len(new)
+
+    def write_dataframe(self, dataframe):
+        self._write_files(dataframe)
+        self._log_change(None)
+
+    def _write_files(self, dataframe):
+        from lqreports.columnar import dumps
+        from lqhours.columnar import encode_hours
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        write_atomic(self.dataframe_path, json.dumps(dataframe).encode("utf-8"))
+        write_atomic(
+            self.columnar_path,
+            dumps(encode_hours(dataframe["data"], dataframe.get("schema"))).encode("utf-8"),
+        )
+        if self.events_path.exists():
+            os.remove(self.events_path)
+        self._uids_version = None
+
+    def load_names(self):
+        if not self.names_path.exists():
+            return []
+        with open(self.names_path, "rb") as f:
+            return json.loads(f.read())
+
+    def write_names(self, names):
+        self.path.mkdir(parents=True, exist_ok=True)
+        write_atomic(self.names_path, json.dumps(names).encode("utf-8"))
+        self._log_change(None)
+
+    def _log_change(self, rows):
+        self._log_number += 1
+        self._log.append((self._log_number, rows))
+        self._log_version = self.version()
+
+    def _check_log(self):
+        """Log a reload if the dataframe file was changed by somebody else."""
+        if self.version() != self._log_version:
+            self._log_change(None)
+
+    def position(self, version):
+        self._check_log()
+        return f"{self._log_id}-{self._log_number}"
+
+    def changes_since(self, position):
+        self._check_log()
+        log_id, _, number = (position or "").rpartition("-")
+        if log_id != self._log_id or not number.isdigit():
+            return None
+        number = int(number)
+        if number > self._log_number or (self._log and number < self._log[0][0] - 1):
+            return None
+        return [
+            (f"{self._log_id}-{n}", rows) for n, rows in self._log if n > number
+        ]
+
+
+class SQLiteBackend(HoursBackend):
+    """Rows in a SQLite database in WAL mode, one table row per hours row.
+
+    Every write is a single transaction touching only the written rows, so the
+    database can be shared by several threads and processes. A generation counter
+    in the meta table serves as the version and as the position in the change log
+    (the changes table), which every write extends in its transaction. On first use
+    an existing hours_dataframe.json and hours_names.json from import_path are imported.
+    """
+
+    def __init__(self, path, import_path=None):
+        self.path = Path(path)
+        self.local = threading.local()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.connection() as c:
+            c.execute(
+                """CREATE TABLE IF NOT EXISTS hours (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    row_id INTEGER NOT NULL UNIQUE,
+                    name TEXT,
+                    year INTEGER,
+                    month INTEGER,
+                    data TEXT NOT NULL
+                )"""
+            )
+            c.execute(
+                "CREATE INDEX IF NOT EXISTS hours_name_year_month ON hours(name, year, month)"
+            )
+            c.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+            c.execute("INSERT OR IGNORE INTO meta(key, value) VALUES ('generation', '0')")
+            c.execute("CREATE TABLE IF NOT EXISTS events (event_id TEXT PRIMARY KEY)")
+            c.execute(
+                "CREATE TABLE IF NOT EXISTS changes (generation INTEGER PRIMARY KEY, rows TEXT)"
+            )
+            columns = [column[1] for column in c.execute("PRAGMA table_info(hours)")]
+            if "uid" not in columns:
+                c.execute("ALTER TABLE hours ADD COLUMN uid TEXT")
+            if "updated" not in columns:
+                c.execute("ALTER TABLE hours ADD COLUMN updated REAL")
+            c.execute("CREATE UNIQUE INDEX IF NOT EXISTS hours_uid ON hours(uid)")
+        if import_path is not None and self.version() == "0":
+            self.import_files(import_path)
+
+    def connection(self):
+        c = getattr(self.local, "connection", None)
+        if c is None:
+            c = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = _Transaction(c)
+            c = self.local.connection
+        return c
+
+    def import_files(self, path):
+        path = Path(path)
+        if (path / DATAFRAME_FILENAME).exists():
+            self.write_dataframe(read_dataframe_file(path / DATAFRAME_FILENAME))
+        if (path / NAMES_FILENAME).exists():
+            with open(path / NAMES_FILENAME, "rb") as f:
+                self.write_names(json.loads(f.read()))
+
+    def _get_meta(self, c, key, default=None):
+        r = c.execute("SELECT value FROM meta WHERE key=?", (key,)).fetchone()
+        return default if r is None else r[0]
+
+    def _set_meta(self, c, key, value):
+        c.execute(
+            "INSERT INTO meta(key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value=excluded.value",
+            (key, value),
+        )
+
+    def _next_generation(self, c, rows=None):
+        """Increment the generation and log the change (rows None for a reload)."""
+        previous = self._get_meta(c, "generation", "0")
+        generation = str(int(previous) + 1)
+        self._set_meta(c, "generation", generation)
+        c.execute(
+            "INSERT OR REPLACE INTO changes(generation, rows) VALUES (?, ?)",
+            (int(generation), None if rows is None else json.dumps(rows)),
+        )
+        c.execute("DELETE FROM changes WHERE generation <= ?", (int(generation) - CHANGES_KEPT,))
+        return previous, generation
+
+    def version(self):
+        return self._get_meta(self.connection(), "generation", "0")
+
+    def load(self):
+        c = self.connection()
+        rows = [json.loads(data) for (data,) in c.execute("SELECT data FROM hours ORDER BY seq")]
+        schema = self._get_meta(c, "schema")
+        dataframe = dict(data=rows)
+        if schema is not None:
+            dataframe["schema"] = json.loads(schema)
+        return dataframe
+
+    def _insert(self, c, rows):
+        c.executemany(
+            "INSERT INTO hours(row_id, uid, name, year, month, updated, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(row_id) DO UPDATE SET uid=COALESCE(excluded.uid, uid), "
+            "name=excluded.name, year=excluded.year, month=excluded.month, "
+            "updated=excluded.updated, data=excluded.data",
+            [
+                (
+                    row["rowid"],
+                    row.get("uid"),
+                    row.get("name"),
+                    row.get("year"),
+                    row.get("month"),
+                    row.get("updated"),
+                    json.dumps(row),
+                )
+                for row in rows
+            ],
+        )
+
+    def _assign_rowids(self, c, rows):
+        """Assign the rowids by uid within the write transaction c."""
+        uids = list({row["uid"] for row in rows if row.get("uid") is not None})
+        if not uids:
+            return rows
+        known = {}
+        for i in range(0, len(uids), SQLITE_MAX_PARAMETERS):
+            chunk = uids[i : i + SQLITE_MAX_PARAMETERS]
+            known.update(
+                c.execute(
+                    "SELECT uid, row_id FROM hours WHERE uid IN (%s)" % ",".join("?" * len(chunk)),
+                    chunk,
+                ).fetchall()
+            )
+        (next_rowid,) = c.execute("SELECT COALESCE(MAX(row_id)+1, 0) FROM hours").fetchone()
+        rows, _ = assign_rowids(rows, known, max(next_rowid, 0))
+        return rows
+
+    def _newer_rows(self, c, rows):
+        """Rows not older than the stored ones (see newer_rows) within the transaction c."""
+        rowids = list({row["rowid"] for row in rows if row.get("updated") is not None})
+        stored = {}
+        for i in range(0, len(rowids), SQLITE_MAX_PARAMETERS):
+            chunk = rowids[i : i + SQLITE_MAX_PARAMETERS]
+            stored.update(
+                c.execute(
+                    "SELECT row_id, updated FROM hours WHERE updated IS NOT NULL "
+                    "AND row_id IN (%s)" % ",".join("?" * len(chunk)),
+                    chunk,
+                ).fetchall()
+            )
+        return newer_rows(rows, stored)
+
+    def write_rows(self, rows, apply):
+        c = self.connection()
+        with c:
+            rows = self._newer_rows(c, self._assign_rowids(c, rows))
+            self._insert(c, rows)
+            apply(rows)
+            return self._next_generation(c, rows)
+
+    def _seen_events(self, c, event_ids):
+        seen = set()
+        for i in range(0, len(event_ids), SQLITE_MAX_PARAMETERS):
+            chunk = event_ids[i : i + SQLITE_MAX_PARAMETERS]
+            seen.update(
+                event_id
+                for (event_id,) in c.execute(
+                    "SELECT event_id FROM events WHERE event_id IN (%s)"
+                    % ",".join("?" * len(chunk)),
+                    chunk,
+                )
+            )
+        return seen
+
+    def write_events(self, event_ids, rows, apply):
+        c = self.connection()
+        with c:
+            seen = self._seen_events(c, event_ids)
+            new = [
+                (event_id, row) for event_id, row in zip(event_ids, rows) if event_id not in seen
+            ]
+            if not new:
+                version = self._get_meta(c, "generation", "0")
+                return version, version, 0
+            new_rows = self._newer_rows(c, self._assign_rowids(c, [row for _, row in new]))
+            c.executemany(
+                "INSERT INTO events(event_id) VALUES (?)", [(event_id,) for event_id, _ in new]
+            )
+            self._insert(c, new_rows)
+            apply(new_rows)
+            previous, generation = self._next_generation(c, new_rows)
+            return previous, generation, len(new)
+
+    def write_dataframe(self, dataframe):
+        c = self.connection()
+        with c:
+            c.execute("DELETE FROM hours")
+            self._insert(c, [validate_row(row) for row in dataframe["data"]])
+            if "schema" in dataframe:
+                self._set_meta(c, "schema", json.dumps(dataframe["schema"]))
+            self._next_generation(c)
+
+    def load_names(self):
+        return json.loads(self._get_meta(self.connection(), "names", "[]"))
+
+    def write_names(self, names):
+        c = self.connection()
+        with c:
+            self._set_meta(c, "names", json.dumps(names))
+            self._next_generation(c)
+
+    def position(self, version):
+        return version
+
+    def changes_since(self, position):
+        try:
+            generation = int(position)
+        except (TypeError, ValueError):
+            return None
+        c = self.connection()
+        # Generations up to current are committed, so the log is read up to it.
+        current = int(self.version())
+        if generation > current:
+            return None
+        changes = c.execute(
+            "SELECT generation, rows FROM changes WHERE generation > ? AND generation <= ? "
+            "ORDER BY generation",
+            (generation, current),
+        ).fetchall()
+        if [g for g, _ in changes] != list(range(generation + 1, current + 1)):
+            return None  # older than the kept log (or written before it existed)
+        return [(str(g), None if rows is None else json.loads(rows)) for g, rows in changes]
+
+
+class _Transaction(object):
+    """SQLite connection wrapper; using it as a context manager runs an immediate
+    transaction (committed on success, rolled back on exception).
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def execute(self, *args):
+        return self.connection.execute(*args)
+
+    def executemany(self, *args):
+        return self.connection.executemany(*args)
+
+    def __enter__(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.connection.execute("COMMIT")
+        else:
+            self.connection.execute("ROLLBACK")
+        return False
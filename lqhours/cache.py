@@ -0,0 +1,208 @@
+"""LiQuer cache for the hours reports.
+
+HoursCache keeps the evaluated states in memory up to a total size in bytes; the
+least recently used states over the limit are spilled to pickle files on disk and
+loaded back into memory when requested again.
+
+Queries starting with hours_data carry the store version as a parameter
+(hours_data-<version>/...). Such states are only cached for the current version
+of the store and all of them are dropped as soon as the version changes, so
+the reports are recomputed exactly when the hours store has been written
+(also by another process). All other queries (hours_data without a version
+and queries not depending on the hours store) are never cached - the cache is
+installed globally (liquer.cache.set_cache), but only the versioned reports
+have a defined invalidation.
+"""
+import hashlib
+import os
+import pickle
+import sys
+import threading
+from collections import OrderedDict
+
+from liquer.cache import CacheMixin
+
+HOURS_QUERY = "hours_data"
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def hours_query(query, version):
+    """Add the store version to a query starting with hours_data (other queries are kept)."""
+    head, _, rest = query.partition("/")
+    if head != HOURS_QUERY:
+        return query
+    query = f"{HOURS_QUERY}-{version}"
+    return f"{query}/{rest}" if rest else query
+
+
+def query_version(query):
+    """Store version of a hours query, "" for hours_data without a version,
+    None if the query does not depend on the hours store.
+    """
+    head = query.partition("/")[0]
+    if head == HOURS_QUERY:
+        return ""
+    if head.startswith(HOURS_QUERY + "-"):
+        return head[len(HOURS_QUERY) + 1 :]
+    return None
+
+
+def data_size(data):
+    """Approximate size of a state data in bytes."""
+    if hasattr(data, "memory_usage"):
+        try:
+            usage = data.memory_usage(deep=True)
+            return int(usage.sum()) if hasattr(usage, "sum") else int(usage)
+        except TypeError:
+            pass
+    if isinstance(data, (bytes, str)):
+        return len(data)
+    return sys.getsizeof(data)
+
+
+class HoursCache(CacheMixin):
+    def __init__(self, version, spill_path="cache", max_bytes=DEFAULT_MAX_BYTES):
+        """version is a function returning the current version of the hours store."""
+        self.version = version
+        self.spill_path = spill_path
+        self.max_bytes = max_bytes
+        self.lock = threading.RLock()
+        self.states = OrderedDict()  # query -> (state, size), the last one most recently used
+        self.metadata = {}
+        self.spilled = set()
+        self.size = 0
+        self.current_version = None
+        os.makedirs(spill_path, exist_ok=True)
+
+    def spill_file(self, key):
+        digest = hashlib.md5(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.spill_path, f"hours_{os.getpid()}_{digest}.pickle")
+
+    def _is_current(self, key):
+        """True only for the hours queries of the current store version.
+
+        If the store version changed, all the hours states are dropped.
+        """
+        version = query_version(key)
+        if not version:
+            return False
+        current = self.version()
+        if current != self.current_version:
+            self.current_version = current
+            self.invalidate()
+        return version == current
+
+    def invalidate(self):
+        """Drop all states depending on the hours store."""
+        with self.lock:
+            for key in list(self.keys()):
+                if query_version(key) is not None:
+                    self.remove(key)
+
+    def _evict(self):
+        while self.size > self.max_bytes and len(self.states) > 1:
+            key, (state, size) = self.states.popitem(last=False)
+            self.size -= size
+            try:
+                with open(self.spill_file(key), "wb") as f:
+                    pickle.dump((state.metadata, state.data), f)
+                self.spilled.add(key)
+            except Exception:
+                # Not picklable or the disk is not writable: just forget the state.
+                if os.path.exists(self.spill_file(key)):
+                    os.remove(self.spill_file(key))
+
+    def _put(self, key, state):
+        size = data_size(state.data)
+        self.states[key] = (state, size)
+        self.size += size
+        self._evict()
+
+    def clean(self):
+        with self.lock:
+            for key in list(self.spilled):
+                self.remove(key)
+            self.states = OrderedDict()
+            self.metadata = {}
+            self.size = 0
+
+    def get(self, key):
+        from liquer.state import State
+
+        with self.lock:
+            if not self._is_current(key):
+                return None
+            if key in self.states:
+                self.states.move_to_end(key)
+                return self.states[key][0].clone()
+            if key in self.spilled:
+                try:
+                    with open(self.spill_file(key), "rb") as f:
+                        metadata, data = pickle.load(f)
+                except Exception:
+                    self.remove(key)
+                    return None
+                state = State()
+                state.metadata = metadata
+                state.data = data
+                os.remove(self.spill_file(key))
+                self.spilled.discard(key)
+                self._put(key, state)
+                return state.clone()
+            return None
+
+    def get_metadata(self, key):
+        with self.lock:
+            if not self._is_current(key):
+                return None
+            if key in self.states:
+                return dict(**self.states[key][0].metadata)
+            metadata = self.metadata.get(key)
+            return None if metadata is None else dict(**metadata)
+
+    def store(self, state):
+        if state.is_error:
+            return None
+        with self.lock:
+            if not self._is_current(state.query):
+                return False
+            self.remove(state.query)
+            state.metadata["status"] = "ready"
+            self._put(state.query, state.clone())
+            return True
+
+    def store_metadata(self, metadata):
+        with self.lock:
+            key = metadata["query"]
+            if not self._is_current(key):
+                return False
+            if key in self.states:
+                self.states[key][0].metadata = metadata
+            else:
+                self.metadata[key] = metadata
+            return True
+
+    def remove(self, key):
+        with self.lock:
+            if key in self.states:
+                self.size -= self.states.pop(key)[1]
+            self.metadata.pop(key, None)
+            if key in self.spilled:
+                self.spilled.discard(key)
+                if os.path.exists(self.spill_file(key)):
+                    os.remove(self.spill_file(key))
+            return True
+
+    def contains(self, key):
+        with self.lock:
+            return (key in self.states or key in self.spilled) and self._is_current(key)
+
+    def keys(self):
+        with self.lock:
+            return list(self.states) + list(self.spilled)
+
+    def __str__(self):
+        return f"Hours cache ({self.max_bytes} bytes in memory, spill to {self.spill_path})"
+
+    def __repr__(self):
+        return f"HoursCache(spill_path={repr(self.spill_path)}, max_bytes={self.max_bytes})"
@@ -0,0 +1,72 @@
+"""Waiting for the changes of the hours store.
+
+The changes are logged by the store backend (see lqhours.backends) together with
+every write, so a client can wait on any worker process for the writes handled by
+any other one. A client keeps the position of its copy of the rows in the log and
+receives the events after it as tuples (position, type, data):
+
+- "rows": data is the list of inserted or changed rows,
+- "reload": the changes can not be described by rows (all rows or names replaced,
+  or the log does not reach back to the position), clients should reload the data.
+
+ChangeFeed wakes the waiting clients immediately after a write through the store of
+this process and re-checks the log every interval seconds for writes by other
+processes.
+"""
+import threading
+import time
+
+DEFAULT_INTERVAL = 0.5
+
+
+class ChangeFeed(object):
+    def __init__(self, store, interval=DEFAULT_INTERVAL):
+        self.store = store
+        self.interval = interval
+        self.condition = threading.Condition()
+        self.writes = 0
+        store.add_listener(self.on_store_change)
+
+    def on_store_change(self, store, rows):
+        """Listener of HoursStore (see HoursStore.add_listener)."""
+        with self.condition:
+            self.writes += 1
+            self.condition.notify_all()
+
+    def position(self):
+        """Position of the current rows (for a client without one)."""
+        return self.store.change_position()
+
+    def since(self, position):
+        """Events after position as a list of (position, type, data).
+
+        If the changes after position are not known, or one of them can not be
+        described by rows, a single reload event is returned.
+        """
+        changes = self.store.changes_since(position)
+        if changes is None:
+            return [(self.position(), "reload", None)]
+        if any(rows is None for _, rows in changes):
+            return [(changes[-1][0], "reload", None)]
+        return [(position, "rows", rows) for position, rows in changes]
+
+    def changes(self, position, timeout=None):
+        """Wait up to timeout seconds for events after position.
+
+        Returns (events, position): the events as a list of (position, type, data)
+        and the position after them.
+        """
+        deadline = time.monotonic() + (timeout or 0)
+        while True:
+            with self.condition:
+                writes = self.writes
+            events = self.since(position)
+            if events:
+                return events, events[-1][0]
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return [], position
+            with self.condition:
+                self.condition.wait_for(
+                    lambda: self.writes != writes, min(self.interval, remaining)
+                )
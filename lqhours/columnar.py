@@ -0,0 +1,58 @@
+"""Columnar storage of the hours records (see lqreports.columnar).
+
+Names are dictionary-encoded, start and end are stored as epoch seconds,
+hours as floats and the row uids (see lqhours.backends) as they are. Row ids and
+the times are mostly increasing, so they are delta-encoded. The position
+of a row is not stored; decoding restores the index column from it.
+"""
+from lqreports import columnar as col
+
+HOURS_ENCODINGS = dict(
+    rowid="int_delta",
+    name="dict",
+    year="int",
+    month="int",
+    start="epoch_delta",
+    end="epoch_delta",
+    hours="float",
+    uid="raw",
+    updated="float",
+)
+
+
+def encode_hours(rows, schema=None):
+    """Encode hours records to a columnar payload."""
+    return col.encode_rows(rows, HOURS_ENCODINGS, schema=schema)
+
+
+def decode_hours(payload):
+    """Decode a columnar payload to a dataframe in the pandas table orientation."""
+    rows = col.decode_rows(payload)
+    for i, row in enumerate(rows):
+        row["index"] = i
+    dataframe = dict(data=rows)
+    if "schema" in payload:
+        dataframe["schema"] = payload["schema"]
+    return dataframe
+
+
+def encode_hours_dataframe(df):
+    """Encode a pandas DataFrame with hours records."""
+    return col.encode_dataframe(df, HOURS_ENCODINGS)
+
+
+def decode_hours_dataframe(payload):
+    """Decode a columnar payload to a pandas DataFrame (start and end as datetime64)."""
+    return col.decode_dataframe(payload)
+
+
+def write_columnar(path, rows, schema=None):
+    with open(path, "w") as f:
+        f.write(col.dumps(encode_hours(rows, schema=schema)))
+
+
+def read_columnar(path):
+    import json
+
+    with open(path) as f:
+        return decode_hours(json.load(f))
@@ -0,0 +1,122 @@
+"""Validation of batches of hours events.
+
+An event is a dictionary
+
+    {"id": "kq2x1-0-4fz", "type": "start", "time": 1617271200000, "row": {...}}
+
+where id is generated by the client (it makes resending a batch harmless),
+type is one of EVENT_TYPES, time (optional) is the client time in milliseconds
+and row is the complete hours row after the event.
+
+Batches may contain thousands of events (queued offline punches or migrated
+timesheets), so they are validated column-wise with pandas rather than event by event.
+"""
+import numpy as np
+import pandas as pd
+
+EVENT_TYPES = ("start", "stop", "edit")
+MAX_REPORTED_ERRORS = 10
+
+
+def events_frame(events):
+    """Convert a list of events to a dataframe with one row per event.
+
+    Columns: id, type, time, rowid, name, start, end, hours and row (the original row).
+    """
+    if not isinstance(events, list):
+        raise ValueError("Expected a list of events")
+    for i, event in enumerate(events):
+        if not isinstance(event, dict) or not isinstance(event.get("row"), dict):
+            raise ValueError(f"Event {i} is not an object with a row: {event}")
+    df = pd.DataFrame.from_records(
+        [(e.get("id"), e.get("type", "edit"), e.get("time")) for e in events],
+        columns=["id", "type", "time"],
+    )
+    rows = pd.DataFrame.from_records(
+        [e["row"] for e in events], columns=["rowid", "name", "start", "end", "hours"]
+    )
+    df = pd.concat([df, rows], axis=1)
+    df["row"] = [e["row"] for e in events]
+    return df
+
+
+def event_errors(df):
+    """Boolean dataframe (one column per check) marking invalid events."""
+    ids = df["id"]
+    rowid = pd.to_numeric(df["rowid"], errors="coerce")
+    start = pd.to_datetime(df["start"], errors="coerce", utc=True, format="ISO8601")
+    end_given = df["end"].notna() & (df["end"] != "")
+    end = pd.to_datetime(df["end"].where(end_given), errors="coerce", utc=True, format="ISO8601")
+    hours = pd.to_numeric(df["hours"], errors="coerce")
+    time = pd.to_numeric(df["time"], errors="coerce")
+    return pd.DataFrame(
+        {
+            "missing id": ids.isna() | (ids.astype(str) == ""),
+            "unknown type": ~df["type"].isin(EVENT_TYPES),
+            "invalid rowid": rowid.isna()
+            | (rowid != np.floor(rowid))
+            | df["rowid"].map(lambda x: isinstance(x, bool)),
+            "missing name": df["name"].isna() | (df["name"].astype(str) == ""),
+            "invalid start": start.isna(),
+            "invalid end": end_given & end.isna(),
+            "end before start": end_given & (end < start),
+            "start event with end": (df["type"] == "start") & end_given,
+            "stop event without end": (df["type"] == "stop") & ~end_given,
+            "negative hours": hours < 0,
+            "invalid time": df["time"].notna() & time.isna(),
+        }
+    )
+
+
+def event_row(row, rowid, time):
+    """The row of an event with the (converted) rowid.
+
+    A row without update time gets the event time, so that the store can refuse it
+    after a newer change of the row (see lqhours.backends).
+    """
+    row = dict(row, rowid=int(rowid))
+    if row.get("updated") is None and not pd.isna(time):
+        row["updated"] = float(time)
+    return row
+
+
+def validate_events(events):
+    """Validate a batch of events.
+
+    Returns the valid events as a dataframe (see events_frame) and the rejected events
+    as a list of dictionaries {"id": ..., "errors": [...]}. One invalid event does not
+    reject the batch, so a client can drop it and keep the rest of its queue.
+    The valid events are ordered by time (events without time follow in the batch order)
+    and duplicate ids within the batch are dropped (the first occurrence is kept).
+    Raises ValueError if events is not a list.
+    """
+    if not isinstance(events, list):
+        raise ValueError("Expected a list of events")
+    valid = []
+    rejected = []
+    for event in events:
+        if isinstance(event, dict) and isinstance(event.get("row"), dict):
+            valid.append(event)
+        else:
+            event_id = event.get("id") if isinstance(event, dict) else None
+            rejected.append(dict(id=event_id, errors=["not an object with a row"]))
+    df = events_frame(valid)
+    errors = event_errors(df)
+    invalid = errors.any(axis=1).to_numpy()
+    for i in np.flatnonzero(invalid):
+        rejected.append(
+            dict(id=valid[i].get("id"), errors=list(errors.columns[errors.loc[i].to_numpy()]))
+        )
+    df = df[~invalid].copy()
+    df["id"] = df["id"].astype(str)
+    df = df.drop_duplicates("id", keep="first")
+    df["time"] = pd.to_numeric(df["time"], errors="coerce")
+    df["rowid"] = pd.to_numeric(df["rowid"]).astype("int64")
+    return df.sort_values("time", kind="stable", na_position="last").reset_index(drop=True), rejected
+
+
+def rejection_messages(rejected):
+    """Messages describing (up to MAX_REPORTED_ERRORS) rejected events."""
+    return [
+        f"event {r['id']}: " + ", ".join(r["errors"]) for r in rejected[:MAX_REPORTED_ERRORS]
+    ]
@@ -0,0 +1,159 @@
+"""Streaming export of hours dataframes to CSV, XLSX and Parquet.
+
+Each iter_* function takes a pandas DataFrame and yields the encoded file in
+chunks of bytes, so that the export can be sent as a streamed response:
+
+- CSV is encoded in blocks of rows,
+- XLSX is written by xlsxwriter in constant memory mode to a temporary file,
+  which is streamed once the workbook is closed,
+- Parquet (requires pyarrow) is written one row group at a time.
+"""
+import importlib.util
+import io
+import tempfile
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "parquet": "application/vnd.apache.parquet",
+}
+# Modules required by the formats (imported only while exporting)
+EXPORT_REQUIREMENTS = {
+    "xlsx": ["xlsxwriter"],
+    "parquet": ["pyarrow"],
+}
+CHUNK_ROWS = 10000
+CHUNK_BYTES = 1024 * 1024
+
+
+def missing_requirements(format):
+    """Modules required to export to format that are not installed."""
+    return [
+        module
+        for module in EXPORT_REQUIREMENTS.get(format, [])
+        if importlib.util.find_spec(module) is None
+    ]
+
+
+def naive_datetimes(df):
+    """Convert timezone-aware datetime columns to naive UTC (spreadsheets have no timezones)."""
+    import pandas as pd
+
+    columns = {
+        name: df[name].dt.tz_convert("UTC").dt.tz_localize(None)
+        for name in df.columns
+        if isinstance(df[name].dtype, pd.DatetimeTZDtype)
+    }
+    return df.assign(**columns) if columns else df
+
+
+def iter_csv(df, chunk_rows=CHUNK_ROWS):
+    yield df.iloc[:0].to_csv(index=False).encode("utf-8")
+    for i in range(0, len(df), chunk_rows):
+        yield df.iloc[i : i + chunk_rows].to_csv(index=False, header=False).encode("utf-8")
+
+
+def iter_file(f, chunk_bytes=CHUNK_BYTES):
+    f.seek(0)
+    while True:
+        data = f.read(chunk_bytes)
+        if not data:
+            break
+        yield data
+
+
+def column_values(series):
+    """Python values of a column for xlsxwriter; missing values become None."""
+    if series.dtype.kind == "M":
+        values = series.dt.to_pydatetime()
+    else:
+        values = series.astype(object)
+    return [None if missing else value for value, missing in zip(values, series.isna())]
+
+
+def iter_xlsx(df, sheet_name="hours"):
+    import xlsxwriter
+
+    df = naive_datetimes(df)
+    with tempfile.TemporaryFile() as f:
+        workbook = xlsxwriter.Workbook(
+            f,
+            {
+                "constant_memory": True,
+                "nan_inf_to_errors": True,
+                "default_date_format": "yyyy-mm-dd hh:mm:ss",
+            },
+        )
+        worksheet = workbook.add_worksheet(sheet_name)
+        worksheet.write_row(0, 0, [str(name) for name in df.columns])
+        row = 1
+        # Rows must be written in order in the constant memory mode
+        for i in range(0, len(df), CHUNK_ROWS):
+            chunk = df.iloc[i : i + CHUNK_ROWS]
+            for values in zip(*[column_values(chunk[name]) for name in chunk.columns]):
+                worksheet.write_row(row, 0, values)
+                row += 1
+        workbook.close()
+        yield from iter_file(f)
+
+
+class _ChunkSink(io.RawIOBase):
+    """Writable file object collecting the written bytes until they are taken."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_parquet(df, chunk_rows=CHUNK_ROWS):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    sink = _ChunkSink()
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    with pq.ParquetWriter(sink, schema) as writer:
+        for i in range(0, len(df), chunk_rows):
+            writer.write_table(
+                pa.Table.from_pandas(df.iloc[i : i + chunk_rows], schema=schema, preserve_index=False)
+            )
+            yield sink.take()
+    yield sink.take()
+
+
+def iter_export(df, format):
+    """Chunks of df exported to format (one of EXPORT_FORMATS).
+
+    The chunks are produced lazily (while a response is being sent), so the arguments
+    are checked first: raises ValueError if df is not a DataFrame or the format is not
+    supported and ImportError if a module required by the format is missing.
+    """
+    import pandas as pd
+
+    if not isinstance(df, pd.DataFrame):
+        raise ValueError(f"Only a dataframe can be exported, got {type(df).__name__}")
+    missing = missing_requirements(format)
+    if missing:
+        raise ImportError(f"Export to {format} requires {', '.join(missing)}")
+    if format == "csv":
+        return iter_csv(df)
+    elif format == "xlsx":
+        return iter_xlsx(df)
+    elif format == "parquet":
+        return iter_parquet(df)
+    raise ValueError(f"Unsupported export format: {format}")
@@ -0,0 +1,139 @@
+"""In-memory indexes over the hours rows, kept up to date incrementally.
+
+An index implements rebuild(rows) and update(old, new), where old is the row
+being replaced (None for an insert) and new is the row being written.
+"""
+from datetime import datetime, timezone
+from lqreports.columnar import to_float
+
+
+def parse_time(value):
+    """ISO time string as an aware datetime (UTC if no offset) or None."""
+    if not isinstance(value, str) or value == "":
+        return None
+    try:
+        time = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return time.replace(tzinfo=timezone.utc) if time.tzinfo is None else time
+
+
+def row_hours(row):
+    """Hours of a row as float (same rules as lqhours.reports.hours_frame).
+
+    The stored hours where they are a finite number, otherwise the duration from
+    start to end; unfinished or invalid entries count as 0.
+    """
+    h = to_float(row.get("hours"))
+    if h is not None:
+        return h
+    start = parse_time(row.get("start"))
+    end = parse_time(row.get("end"))
+    if start is None or end is None:
+        return 0.0
+    return (end - start).total_seconds() / 3600.0
+
+
+def month_key(row):
+    """(year, month) of a row (from the start time if not stored) or None
+    if the row has no valid date.
+    """
+    try:
+        return (int(row.get("year")), int(row.get("month")))
+    except (TypeError, ValueError):
+        pass
+    start = parse_time(row.get("start"))
+    if start is None:
+        return None
+    start = start.astimezone(timezone.utc)
+    return (start.year, start.month)
+
+
+class MonthlyIndex(object):
+    """Total hours per name, year and month."""
+
+    def __init__(self):
+        self.months = {}
+
+    def rebuild(self, rows):
+        self.months = {}
+        for row in rows:
+            self._add(row, 1)
+
+    def update(self, old, new):
+        if old is not None:
+            self._add(old, -1)
+        if new is not None:
+            self._add(new, 1)
+
+    def _add(self, row, sign):
+        key = month_key(row)
+        if key is None:
+            return
+        name = row.get("name")
+        months = self.months.setdefault(name, {})
+        hours, count = months.get(key, (0.0, 0))
+        hours += sign * row_hours(row)
+        count += sign
+        if count > 0:
+            months[key] = (hours, count)
+        else:
+            del months[key]
+            if not months:
+                del self.months[name]
+
+    def hours(self, name, year, month):
+        return self.months.get(name, {}).get((year, month), (0.0, 0))[0]
+
+    def overview(self, names=None, last=3):
+        """Summary rows with the last months of each name.
+
+        Names are taken in the given order (all indexed names if None).
+        """
+        if names is None:
+            names = sorted(self.months, key=str)
+        summary = []
+        for name in names:
+            months = self.months.get(name, {})
+            keys = sorted(months)
+            if last is not None:
+                keys = keys[max(len(keys) - last, 0):]
+            for year, month in keys:
+                summary.append(
+                    dict(name=name, year=year, month=month, hours=months[(year, month)][0])
+                )
+        return summary
+
+
+def is_open(row):
+    """True for a started row that has not been stopped yet."""
+    return row.get("end") in ("", None)
+
+
+class OpenSessionIndex(object):
+    """Rowid of the open (started, not stopped) row of each name.
+
+    Like the client, only the last row of a name can be open: a new finished row
+    closes the session of its name.
+    """
+
+    def __init__(self):
+        self.open = {}
+
+    def rebuild(self, rows):
+        self.open = {}
+        for row in rows:
+            self.update(None, row)
+
+    def update(self, old, new):
+        if old is not None and self.open.get(old.get("name")) == old.get("rowid"):
+            del self.open[old.get("name")]
+        if new is None:
+            return
+        if is_open(new):
+            self.open[new.get("name")] = new.get("rowid")
+        elif old is None:
+            self.open.pop(new.get("name"), None)
+
+    def rowid(self, name):
+        return self.open.get(name)
@@ -0,0 +1,60 @@
+"""Server-side paging, sorting and searching of the hours rows."""
+import math
+
+
+def sort_key(value):
+    """Numbers (including numeric strings like the hours) first, then other values
+    as strings, then missing values.
+    """
+    if value is None or value == "":
+        return (2, "")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (0, value)
+    if isinstance(value, str):
+        try:
+            number = float(value)
+        except ValueError:
+            pass
+        else:
+            if math.isfinite(number):
+                return (0, number)
+    return (1, str(value))
+
+
+def matches(row, search):
+    return any(search in str(value).lower() for value in row.values() if value is not None)
+
+
+def query_rows(
+    rows,
+    page=1,
+    items_per_page=10,
+    sort_by=(),
+    sort_desc=(),
+    search=None,
+    filters=None,
+):
+    """Filter, sort and slice rows like a server-side v-data-table.
+
+    filters is a dictionary column -> required value, search is a case-insensitive
+    substring matched against all values, sort_by and sort_desc are lists of columns
+    and flags. Page numbers start at 1, items_per_page<=0 returns all rows.
+    Returns a dictionary with the total number of matching rows and the page data.
+    """
+    if filters:
+        rows = [
+            row for row in rows if all(row.get(k) == v for k, v in filters.items())
+        ]
+    if search:
+        search = search.lower()
+        rows = [row for row in rows if matches(row, search)]
+    else:
+        rows = list(rows)
+    sort_desc = list(sort_desc) + [False] * (len(sort_by) - len(sort_desc))
+    for column, desc in reversed(list(zip(sort_by, sort_desc))):
+        rows.sort(key=lambda row: sort_key(row.get(column)), reverse=desc)
+    total = len(rows)
+    if items_per_page > 0:
+        start = (max(page, 1) - 1) * items_per_page
+        rows = rows[start : start + items_per_page]
+    return dict(total=total, data=rows)
@@ -0,0 +1,129 @@
+"""Hours reports computed on the server with pandas.
+
+The rows are loaded into a DataFrame once, start and end are parsed to datetime64
+(UTC) and the durations are computed for all rows at once. Reports are group-bys
+over that frame:
+
+    df = load_hours(store)
+    monthly_pivot(df)      # name x month table of hours
+"""
+import numpy as np
+import pandas as pd
+
+HOURS_COLUMNS = ["rowid", "name", "year", "month", "start", "end", "hours"]
+
+
+def parse_times(values):
+    """Parse ISO strings to datetime64 (UTC); empty and invalid values become NaT."""
+    values = pd.Series(values, dtype="object")
+    return pd.to_datetime(
+        values.where(values != ""), errors="coerce", utc=True, format="ISO8601"
+    )
+
+
+def hours_frame(rows, now=None):
+    """DataFrame of hours rows with start and end as datetime64 and numeric hours.
+
+    hours are the stored hours (which may have been corrected by an admin) where
+    they are a finite number, otherwise the duration from start to end; the stored
+    value is kept as stored_hours. Open rows (no end) without stored hours get
+    the hours until now if now is given (a datetime, string or pandas Timestamp),
+    otherwise NaN; they are marked by the open column. year and month default to
+    the start time (UTC) where not stored. The same rules are used by
+    lqhours.index.MonthlyIndex.
+    """
+    df = pd.DataFrame.from_records(rows, columns=HOURS_COLUMNS)
+    df["start"] = parse_times(df["start"])
+    df["end"] = parse_times(df["end"])
+    df["open"] = df["end"].isna() & df["start"].notna()
+    end = df["end"]
+    if now is not None:
+        now = pd.Timestamp(now)
+        now = now.tz_localize("UTC") if now.tzinfo is None else now.tz_convert("UTC")
+        end = end.where(~df["open"], now)
+    df["stored_hours"] = pd.to_numeric(df["hours"], errors="coerce")
+    stored = df["stored_hours"].where(np.isfinite(df["stored_hours"].astype("float64")))
+    df["hours"] = stored.fillna((end - df["start"]) / np.timedelta64(1, "h"))
+    for column, values in (("year", df["start"].dt.year), ("month", df["start"].dt.month)):
+        df[column] = pd.to_numeric(df[column], errors="coerce").fillna(values).astype("Int64")
+    return df
+
+
+def format_hours(hours):
+    """Hours as "h:mm" text, formatted like format_hours in the client.
+
+    hours may be a number or a string; None, invalid and infinite values give ""
+    (an empty or blank string is 0, like a javascript number conversion).
+    """
+    return formatted_hours(pd.Series([hours], dtype="object")).iloc[0]
+
+
+def formatted_hours(values):
+    """Series of "h:mm" texts of the hours values (see format_hours)."""
+    values = pd.Series(values, dtype="object")
+    text = values.map(lambda x: x.strip() if isinstance(x, str) else x)
+    numbers = pd.to_numeric(text.where(text != "", 0), errors="coerce").astype("float64")
+    valid = np.isfinite(numbers.to_numpy())
+    hours = np.where(valid, numbers.to_numpy(), 0.0)
+    h = np.trunc(hours)
+    m = (np.trunc(hours * 60) - h * 60).astype("int64")
+    minutes = pd.Series(m, index=values.index).astype(str)
+    minutes = minutes.where(m >= 10, "0" + minutes).where(m != 0, "00")
+    result = pd.Series(h.astype("int64"), index=values.index).astype(str) + ":" + minutes
+    return result.where(valid, "")
+
+
+def load_hours(store, now=None):
+    """hours_frame of the rows in a HoursStore."""
+    with store.lock:
+        rows = list(store.rows())
+    return hours_frame(rows, now=now)
+
+
+def monthly_totals(df):
+    """Total hours and number of records per name, year and month."""
+    return (
+        df.groupby(["name", "year", "month"], sort=True)
+        .agg(hours=("hours", "sum"), records=("hours", "count"))
+        .reset_index()
+    )
+
+
+def monthly_pivot(df, names=None):
+    """Table of total hours with names as rows and "YYYY-MM" months as columns.
+
+    Missing combinations are 0. If names are given, the rows follow their order and
+    the other names in df (e.g. removed from the list) follow in alphabetical order.
+    """
+    totals = df.groupby(["name", "year", "month"], sort=True)["hours"].sum()
+    pivot = totals.unstack(["year", "month"], fill_value=0.0)
+    pivot = pivot.sort_index(axis=1)
+    pivot.columns = [f"{year:04d}-{month:02d}" for year, month in pivot.columns]
+    pivot.columns.name = "month"
+    if names is not None:
+        names = list(dict.fromkeys(names))
+        listed = set(names)
+        pivot = pivot.reindex(
+            names + [name for name in pivot.index if name not in listed], fill_value=0.0
+        )
+    return pivot
+
+
+def user_totals(df):
+    """Total hours, number of records and first/last start per name."""
+    return (
+        df.groupby("name", sort=True)
+        .agg(
+            hours=("hours", "sum"),
+            records=("hours", "count"),
+            first=("start", "min"),
+            last=("start", "max"),
+        )
+        .reset_index()
+    )
+
+
+def open_sessions(df):
+    """Rows that have been started and not stopped yet."""
+    started = df["end"].isna() & df["start"].notna()
+    return df.loc[started, ["rowid", "name", "start", "hours"]].reset_index(drop=True)
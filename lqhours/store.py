@@ -0,0 +1,295 @@
+"""Server-side storage of the hours records.
+
+HoursStore keeps the rows in memory together with indexes over them and persists
+them through a backend (see lqhours.backends). Clients send only new or changed
+rows, which are written to the backend row by row where the backend allows it.
+New rows are identified by a uid generated by the client; their rowids are assigned
+by the backend (see lqhours.backends).
+"""
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+from lqreports.columnar import dumps
+from lqhours.backends import (
+    SQLITE_FILENAME,
+    JsonFileBackend,
+    SQLiteBackend,
+    renumber_dataframe,
+    validate_row,
+)
+from lqhours.columnar import encode_hours
+from lqhours.events import event_row, rejection_messages, validate_events
+from lqhours.index import MonthlyIndex, OpenSessionIndex
+from lqhours.query import query_rows
+
+
+def open_store(path, backend="sqlite"):
+    """Create HoursStore for a data folder.
+
+    backend is "json" (hours_dataframe.json and hours_names.json in the folder) or
+    "sqlite" (hours.sqlite in the folder; the json files are imported on first use).
+    """
+    path = Path(path)
+    if backend == "json":
+        return HoursStore(JsonFileBackend(path))
+    elif backend == "sqlite":
+        return HoursStore(SQLiteBackend(path / SQLITE_FILENAME, import_path=path))
+    raise ValueError(f"Unsupported hours store backend: {backend}")
+
+
+def assigned_rowids(rows):
+    """Dictionary uid -> rowid of the written rows with uid."""
+    return {row["uid"]: row["rowid"] for row in rows if row.get("uid") is not None}
+
+
+class HoursStore(object):
+    def __init__(self, backend):
+        self.backend = backend
+        self.lock = threading.RLock()
+        self._dataframe = None
+        self._version = None
+        self._positions = {}
+        self._columnar = None
+        self._json = None
+        self.modified = time.time()
+        self.monthly_index = MonthlyIndex()
+        self.open_session_index = OpenSessionIndex()
+        self.indexes = [self.monthly_index, self.open_session_index]
+        self.listeners = []
+        self.dataframe()
+
+    def add_listener(self, callback):
+        """Register callback(store, rows), called after every write through this store.
+
+        rows are the inserted or changed rows, None if all rows or the names were replaced.
+        """
+        self.listeners.append(callback)
+
+    def _notify(self, rows=None):
+        for callback in self.listeners:
+            callback(self, rows)
+
+    def version_token(self):
+        """Short string identifying the stored rows and names; changes with every write
+        (including writes by other processes).
+        """
+        with self.lock:
+            version = (self.backend.version(), self.backend.load_names())
+        return hashlib.sha1(repr(version).encode("utf-8")).hexdigest()[:16]
+
+    def change_position(self):
+        """Position of the current rows in the change log of the backend (see changes_since)."""
+        with self.lock:
+            self.dataframe()
+            return self.backend.position(self._version)
+
+    def changes_since(self, position):
+        """Changes written after position (also by other processes) as a list of
+        (position, rows); rows are None if all rows or the names were replaced.
+        Returns None if the changes are not known (the client should reload).
+        """
+        with self.lock:
+            return self.backend.changes_since(position)
+
+    def dataframe(self):
+        """Stored dataframe in the pandas table orientation.
+
+        The backend may be changed by another process, so the cached copy is reloaded
+        whenever the backend version changes.
+        """
+        with self.lock:
+            version = self.backend.version()
+            if self._dataframe is None or version != self._version:
+                self._set_dataframe(self.backend.load())
+                self._version = version
+            return self._dataframe
+
+    def rows(self):
+        return self.dataframe()["data"]
+
+    def dataframe_bytes(self):
+        """Stored dataframe serialized as json (as hours_dataframe.json)."""
+        with self.lock:
+            self.dataframe()
+            if self._json is None:
+                self._json = json.dumps(self._dataframe).encode("utf-8")
+            return self._json
+
+    def columnar_bytes(self):
+        """Stored dataframe in the columnar format (see lqhours.columnar).
+
+        The payload also contains the position of the rows in the change log, from
+        which a client continues waiting for changes (see changes_since).
+        """
+        with self.lock:
+            self.dataframe()
+            if self._columnar is None:
+                payload = encode_hours(self._dataframe["data"], self._dataframe.get("schema"))
+                payload["position"] = self.backend.position(self._version)
+                self._columnar = dumps(payload).encode("utf-8")
+            return self._columnar
+
+    def _set_dataframe(self, dataframe):
+        self._dataframe = dataframe
+        self._columnar = None
+        self._json = None
+        self.modified = time.time()
+        self._positions = {
+            row.get("rowid"): i for i, row in enumerate(dataframe["data"])
+        }
+        for index in self.indexes:
+            index.rebuild(dataframe["data"])
+
+    def query(self, **kwargs):
+        """Page of rows, see lqhours.query.query_rows for the arguments."""
+        with self.lock:
+            return query_rows(self.rows(), **kwargs)
+
+    def overview(self, last=3):
+        """Monthly hours summary for the stored names (see MonthlyIndex.overview)."""
+        with self.lock:
+            self.dataframe()
+            names = self.names()
+            if not names:
+                names = None
+            return self.monthly_index.overview(names, last=last)
+
+    def open_row(self, name):
+        """Open row of a name or None."""
+        with self.lock:
+            self.dataframe()
+            rowid = self.open_session_index.rowid(name)
+            if rowid is None:
+                return None
+            return self._dataframe["data"][self._positions[rowid]]
+
+    def open_sessions(self):
+        """Dictionary of open rows by name."""
+        with self.lock:
+            self.dataframe()
+            data = self._dataframe["data"]
+            return {
+                name: data[self._positions[rowid]]
+                for name, rowid in self.open_session_index.open.items()
+            }
+
+    def names(self):
+        with self.lock:
+            return self.backend.load_names()
+
+    def store_names(self, names):
+        if not isinstance(names, list):
+            raise ValueError("Names must be a list")
+        with self.lock:
+            self.backend.write_names(names)
+            self._columnar = None  # the change position moved
+            self.modified = time.time()
+        self._notify()
+
+    def store_dataframe(self, dataframe):
+        """Replace all rows."""
+        if not isinstance(dataframe, dict) or not isinstance(dataframe.get("data"), list):
+            raise ValueError("Dataframe must be an object with a data list")
+        dataframe = renumber_dataframe(dataframe)
+        uids = [row["uid"] for row in dataframe["data"] if row.get("uid") is not None]
+        if len(set(uids)) != len(uids):
+            raise ValueError("Rows with duplicate uids")
+        with self.lock:
+            self.backend.write_dataframe(dataframe)
+            self._dataframe = None
+            self.dataframe()
+        self._notify()
+
+    def _upsert(self, row):
+        data = self._dataframe["data"]
+        position = self._positions.get(row["rowid"])
+        if position is None:
+            self._positions[row["rowid"]] = len(data)
+            data.append(row)
+            old = None
+        else:
+            old = data[position]
+            data[position] = row
+        for index in self.indexes:
+            index.update(old, row)
+        return old
+
+    def _apply(self, applied):
+        """Function applying the rows assigned by the backend to the cached state."""
+
+        def apply(rows):
+            applied.extend(rows)
+            self._columnar = None
+            self._json = None
+            self.modified = time.time()
+            for row in rows:
+                self._upsert(row)
+            return self._dataframe
+
+        return apply
+
+    def apply_rows(self, rows):
+        """Insert or replace rows (keyed by uid or rowid) and persist them.
+
+        Returns the rows as written, with the rowids assigned by the backend.
+        """
+        rows = [validate_row(row) for row in rows]
+        if not rows:
+            return []
+        applied = []
+        with self.lock:
+            self.dataframe()
+            try:
+                previous, version = self.backend.write_rows(rows, self._apply(applied))
+            except Exception:
+                self._dataframe = None
+                raise
+            # If somebody else wrote in the meantime, reload on the next access.
+            self._version = version if previous == self._version else None
+        self._notify(applied)
+        return applied
+
+    def apply_events(self, events):
+        """Apply a batch of events (see lqhours.events) in a single backend write.
+
+        Events with ids already applied before are skipped, so a batch can be resent.
+        Invalid events are rejected individually, the valid ones are applied.
+        Returns a dictionary with the numbers of received, accepted, duplicate and stale
+        events (accepted, but older than the stored row, see lqhours.backends), the ids
+        of the rejected events with the reasons (errors) and the rowids assigned to the
+        rows with uid (see assigned_rowids).
+        """
+        df, rejected = validate_events(events)
+        event_ids = []
+        rows = []
+        for event_id, row, rowid, event_time in zip(df["id"], df["row"], df["rowid"], df["time"]):
+            try:
+                rows.append(validate_row(event_row(row, rowid, event_time)))
+                event_ids.append(event_id)
+            except ValueError as e:
+                rejected.append(dict(id=event_id, errors=[str(e)]))
+        applied = []
+        with self.lock:
+            self.dataframe()
+            try:
+                previous, version, accepted = self.backend.write_events(
+                    event_ids, rows, self._apply(applied)
+                )
+            except Exception:
+                self._dataframe = None
+                raise
+            if accepted:
+                self._version = version if previous == self._version else None
+        if accepted:
+            self._notify(applied)
+        return dict(
+            events=len(events),
+            accepted=accepted,
+            duplicates=len(events) - accepted - len(rejected),
+            stale=accepted - len(applied),
+            rejected=[r["id"] for r in rejected],
+            errors=rejection_messages(rejected),
+            rowids=assigned_rowids(applied),
+        )
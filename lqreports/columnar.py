@@ -0,0 +1,408 @@
+"""Compact columnar encoding of tabular data.
+
+Instead of a list of records repeating all the keys, the payload stores one
+array per column:
+
+    {
+        "format": "columnar",
+        "version": 2,
+        "length": 2,
+        "columns": {
+            "rowid": {"encoding": "int_delta", "values": [0, 1]},
+            "name": {"encoding": "dict", "dictionary": ["A", "B"], "codes": [0, 1]},
+            "start": {"encoding": "epoch_delta", "values": [1617271200, 3600]},
+            "hours": {"encoding": "float", "values": [1.5, null]}
+        }
+    }
+
+Supported encodings:
+- dict: dictionary-encoded values (typically strings)
+- epoch: timestamps as integer seconds since 1970-01-01 UTC, decoded to ISO strings
+- int, float: numbers, invalid values are stored as null
+- int_delta, epoch_delta: as int and epoch, but every value is stored as the difference
+  to the previous non-null value (the first one as it is); short for sorted columns
+  like row ids and start times
+- raw: values stored as they are
+
+Version 2 added the delta encodings; version 1 payloads are still read.
+"""
+import json
+import math
+from datetime import datetime, timezone
+
+COLUMNAR_FORMAT = "columnar"
+COLUMNAR_VERSION = 2
+COLUMNAR_VERSIONS = (1, 2)
+DELTA_SUFFIX = "_delta"
+
+JS_DECODER = """
+    function lqreports_decode_columnar(payload){
+        var n = payload.length;
+        var rows = new Array(n);
+        for (var i=0; i<n; i++){
+            rows[i]={};
+        }
+        for (var name in payload.columns){
+            var c = payload.columns[name];
+            var encoding = c.encoding;
+            var values = c.values;
+            if (encoding=="int_delta" || encoding=="epoch_delta"){
+                var previous = 0;
+                values = new Array(n);
+                for (var i=0; i<n; i++){
+                    var d = c.values[i];
+                    values[i] = (d==null) ? null : (previous += d);
+                }
+                encoding = encoding.slice(0, -6);
+            }
+            if (encoding=="dict"){
+                for (var i=0; i<n; i++){
+                    var code = c.codes[i];
+                    rows[i][name] = (code==null) ? null : c.dictionary[code];
+                }
+            }
+            else if (encoding=="epoch"){
+                for (var i=0; i<n; i++){
+                    var t = values[i];
+                    rows[i][name] = (t==null) ? "" : new Date(t*1000).toISOString();
+                }
+            }
+            else{
+                for (var i=0; i<n; i++){
+                    rows[i][name] = values[i];
+                }
+            }
+        }
+        return rows;
+    }
+"""
+
+
+def to_epoch(value):
+    """Convert ISO string, datetime or pandas Timestamp to integer epoch seconds."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return int(value) if math.isfinite(value) else None
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    if hasattr(value, "to_pydatetime"):
+        if value != value:  # NaT
+            return None
+        value = value.to_pydatetime()
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return int(value.timestamp())
+
+
+def from_epoch(value):
+    """Inverse of to_epoch, produces the same format as javascript Date.toISOString."""
+    if value is None:
+        return ""
+    return datetime.fromtimestamp(value, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+def to_float(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def to_int(value):
+    value = to_float(value)
+    return None if value is None else int(value)
+
+
+def delta_base(encoding):
+    """Encoding of the values of a delta encoding, None for the other encodings."""
+    if encoding in ("int" + DELTA_SUFFIX, "epoch" + DELTA_SUFFIX):
+        return encoding[: -len(DELTA_SUFFIX)]
+    return None
+
+
+def delta_encode(values):
+    """Differences of the values to the previous non-null value, nulls are kept."""
+    previous = 0
+    encoded = []
+    for value in values:
+        if value is None:
+            encoded.append(None)
+        else:
+            encoded.append(value - previous)
+            previous = value
+    return encoded
+
+
+def delta_decode(values):
+    """Inverse of delta_encode."""
+    previous = 0
+    decoded = []
+    for value in values:
+        if value is None:
+            decoded.append(None)
+        else:
+            previous += value
+            decoded.append(previous)
+    return decoded
+
+
+def encode_column(values, encoding):
+    base = delta_base(encoding)
+    if base is not None:
+        return dict(encoding=encoding, values=delta_encode(encode_column(values, base)["values"]))
+    if encoding == "dict":
+        dictionary = []
+        codes = {}
+        encoded = []
+        for value in values:
+            if value is None:
+                encoded.append(None)
+                continue
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(dictionary)
+                dictionary.append(value)
+            encoded.append(code)
+        return dict(encoding=encoding, dictionary=dictionary, codes=encoded)
+    elif encoding == "epoch":
+        return dict(encoding=encoding, values=[to_epoch(v) for v in values])
+    elif encoding == "float":
+        return dict(encoding=encoding, values=[to_float(v) for v in values])
+    elif encoding == "int":
+        return dict(encoding=encoding, values=[to_int(v) for v in values])
+    elif encoding == "raw":
+        return dict(encoding=encoding, values=list(values))
+    raise Exception(f"Unsupported columnar encoding: {encoding}")
+
+
+def decode_column(column):
+    encoding = column["encoding"]
+    base = delta_base(encoding)
+    if base is not None:
+        return decode_column(dict(encoding=base, values=delta_decode(column["values"])))
+    if encoding == "dict":
+        dictionary = column["dictionary"]
+        return [None if code is None else dictionary[code] for code in column["codes"]]
+    elif encoding == "epoch":
+        return [from_epoch(v) for v in column["values"]]
+    elif encoding in ("float", "int", "raw"):
+        return list(column["values"])
+    raise Exception(f"Unsupported columnar encoding: {encoding}")
+
+
+def encode_rows(rows, encodings, schema=None):
+    """Encode a list of records; encodings is a dictionary column -> encoding."""
+    payload = dict(
+        format=COLUMNAR_FORMAT,
+        version=COLUMNAR_VERSION,
+        length=len(rows),
+        columns={
+            name: encode_column([row.get(name) for row in rows], encoding)
+            for name, encoding in encodings.items()
+        },
+    )
+    if schema is not None:
+        payload["schema"] = schema
+    return payload
+
+
+def decode_rows(payload):
+    """Decode payload to a list of records."""
+    check_payload(payload)
+    columns = {name: decode_column(c) for name, c in payload["columns"].items()}
+    return [
+        {name: values[i] for name, values in columns.items()}
+        for i in range(payload["length"])
+    ]
+
+
+def check_payload(payload):
+    if not isinstance(payload, dict) or payload.get("format") != COLUMNAR_FORMAT:
+        raise Exception("Not a columnar payload")
+    if payload.get("version") not in COLUMNAR_VERSIONS:
+        raise Exception(f"Unsupported columnar version: {payload.get('version')}")
+
+
+def default_encoding(series):
+    import pandas as pd
+
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "epoch"
+    if pd.api.types.is_bool_dtype(series):
+        return "raw"
+    if pd.api.types.is_integer_dtype(series):
+        return "int"
+    if pd.api.types.is_float_dtype(series):
+        return "float"
+    return "dict"
+
+
+def masked_list(values, valid):
+    """List with values (numpy array) at the valid positions and None elsewhere."""
+    import numpy as np
+
+    if valid.all():
+        return values.tolist()
+    result = np.full(len(valid), None, dtype=object)
+    result[valid] = values.tolist()
+    return result.tolist()
+
+
+def _fill_invalid(series, result, convert):
+    """Convert the values not recognized by pandas (NaN in result) one by one."""
+    import numpy as np
+
+    for i in np.flatnonzero(np.isnan(result) & series.notna().to_numpy()):
+        value = convert(series.iat[i])
+        if value is not None:
+            result[i] = value
+
+
+def series_numbers(series):
+    """Values of a series as a float64 array, NaN for the invalid values (as to_float)."""
+    import numpy as np
+    import pandas as pd
+
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+        numbers = series.to_numpy(dtype="float64", na_value=np.nan, copy=True)
+    else:
+        try:
+            numbers = series.astype("float64").to_numpy(copy=True)
+        except (TypeError, ValueError):
+            numbers = pd.to_numeric(series, errors="coerce").to_numpy(
+                dtype="float64", na_value=np.nan, copy=True
+            )
+            _fill_invalid(series, numbers, to_float)
+    numbers[~np.isfinite(numbers)] = np.nan
+    return numbers
+
+
+def _times_epochs(times):
+    """Epoch seconds of a datetime64 series (naive times are UTC), NaN for NaT."""
+    import numpy as np
+    import pandas as pd
+
+    if times.dt.tz is None:
+        times = times.dt.tz_localize("UTC")
+    return ((times - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(seconds=1)).to_numpy(
+        dtype="float64", na_value=np.nan, copy=True
+    )
+
+
+def series_epochs(series):
+    """Values of a series as epoch seconds in a float64 array, NaN for the missing
+    and invalid values (as to_epoch).
+    """
+    import numpy as np
+    import pandas as pd
+
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return _times_epochs(series)
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        return np.trunc(series_numbers(series))
+    epochs = np.full(len(series), np.nan)
+    # ISO strings in UTC (as from Date.toISOString) are parsed by numpy, several
+    # times faster than by pandas; the others by pandas and then one by one.
+    try:
+        utc = series.str.endswith("Z", na=False).to_numpy(dtype=bool, copy=True)
+    except AttributeError:
+        utc = np.zeros(len(series), dtype=bool)
+    if utc.any():
+        try:
+            parsed = series[utc].str.slice(0, -1).to_numpy(dtype="datetime64[ms]")
+        except ValueError:
+            utc[:] = False
+        else:
+            seconds = (parsed.astype("int64") // 1000).astype("float64")
+            seconds[np.isnat(parsed)] = np.nan
+            epochs[utc] = seconds
+    if not utc.all():
+        rest = ~utc
+        epochs[rest] = _times_epochs(
+            pd.to_datetime(series[rest], utc=True, errors="coerce", format="ISO8601")
+        )
+        _fill_invalid(series, epochs, to_epoch)
+    return epochs
+
+
+def encode_series(series, encoding):
+    """Vectorized encode_column of a pandas Series."""
+    import numpy as np
+    import pandas as pd
+
+    if encoding == "dict":
+        codes, uniques = pd.factorize(series)
+        valid = codes >= 0
+        return dict(
+            encoding=encoding, dictionary=uniques.tolist(), codes=masked_list(codes[valid], valid)
+        )
+    if encoding == "raw":
+        # Missing values as None (NaN is not valid JSON)
+        values = series.astype(object)
+        return dict(encoding=encoding, values=values.where(series.notna(), None).tolist())
+    base = delta_base(encoding) or encoding
+    if base == "float":
+        numbers = series_numbers(series)
+        valid = ~np.isnan(numbers)
+        return dict(encoding=encoding, values=masked_list(numbers[valid], valid))
+    if base == "int" and pd.api.types.is_integer_dtype(series) and not series.hasnans:
+        numbers = series.to_numpy(dtype="int64")  # exact, also above 2**53
+        valid = np.ones(len(series), dtype=bool)
+    elif base in ("int", "epoch"):
+        numbers = series_epochs(series) if base == "epoch" else np.trunc(series_numbers(series))
+        valid = ~np.isnan(numbers)
+        numbers = numbers[valid].astype("int64")
+    else:
+        raise Exception(f"Unsupported columnar encoding: {encoding}")
+    if base != encoding:
+        numbers = np.diff(numbers, prepend=0)
+    return dict(encoding=encoding, values=masked_list(numbers, valid))
+
+
+def encode_dataframe(df, encodings=None, schema=None, rowid_column=None):
+    """Encode a pandas DataFrame; missing encodings are derived from the dtypes.
+
+    If rowid_column is specified, a column with the row numbers is added
+    (without copying the dataframe).
+    """
+    encodings = {} if encodings is None else dict(encodings)
+    payload = dict(
+        format=COLUMNAR_FORMAT,
+        version=COLUMNAR_VERSION,
+        length=len(df),
+        columns={},
+    )
+    if rowid_column is not None:
+        payload["columns"][rowid_column] = dict(
+            encoding="int" + DELTA_SUFFIX, values=[0] + [1] * (len(df) - 1) if len(df) else []
+        )
+    for name in df.columns:
+        encoding = encodings.get(name) or default_encoding(df[name])
+        payload["columns"][name] = encode_series(df[name], encoding)
+    if schema is not None:
+        payload["schema"] = schema
+    return payload
+
+
+def decode_dataframe(payload):
+    """Decode payload to a pandas DataFrame, epoch columns become datetime64 (UTC)."""
+    import pandas as pd
+
+    check_payload(payload)
+    data = {}
+    for name, c in payload["columns"].items():
+        if c["encoding"] in ("epoch", "epoch" + DELTA_SUFFIX):
+            values = c["values"] if c["encoding"] == "epoch" else delta_decode(c["values"])
+            data[name] = pd.to_datetime(pd.Series(values, dtype="float64"), unit="s", utc=True)
+        else:
+            data[name] = decode_column(c)
+    return pd.DataFrame(data, columns=list(payload["columns"]))
+
+
+def dumps(payload):
+    return json.dumps(payload, separators=(",", ":"))
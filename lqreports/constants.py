@@ -3,3 +3,4 @@ from enum import Enum
 class LinkType(Enum):
     LINK=1
     DATAURL=2
+    STATIC=3
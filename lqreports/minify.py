@@ -0,0 +1,192 @@
+"""Lightweight processing of the generated javascript.
+
+The code is split into tokens (strings, template literals, regular expression
+literals, comments, whitespace, words and punctuation), so that the processing
+never touches the content of strings or regular expressions:
+
+- strip_console replaces console.log(...) calls by "void 0" (still a valid
+  expression or statement, so the surrounding code does not need to change),
+- minify_js removes comments, indentation and blank lines. Line breaks are kept,
+  so that code relying on the automatic semicolon insertion keeps working.
+"""
+import re
+
+WORD_CHARS = re.compile(r"[A-Za-z0-9_$\u0080-\uffff]")
+REGEX_PRECEDING_PUNCTUATION = set("(,=:[!&|?{};+-*%<>~^")
+REGEX_PRECEDING_WORDS = {
+    "return", "typeof", "case", "do", "else", "in", "instanceof", "new", "void", "delete", "throw",
+}
+
+
+def _is_word_char(c):
+    return WORD_CHARS.match(c) is not None
+
+
+def _scan_quoted(code, i):
+    """Index after the string or template literal starting at code[i]."""
+    quote = code[i]
+    i += 1
+    while i < len(code):
+        c = code[i]
+        if c == "\\":
+            i += 2
+            continue
+        if c == quote:
+            return i + 1
+        if c == "\n" and quote != "`":
+            return i  # unterminated string, stop at the end of line
+        i += 1
+    return i
+
+
+def _scan_regex(code, i):
+    """Index after the regular expression literal starting at code[i] or None."""
+    j = i + 1
+    in_class = False
+    while j < len(code):
+        c = code[j]
+        if c == "\\":
+            j += 2
+            continue
+        if c == "\n":
+            return None
+        if in_class:
+            if c == "]":
+                in_class = False
+        elif c == "[":
+            in_class = True
+        elif c == "/":
+            j += 1
+            while j < len(code) and _is_word_char(code[j]):
+                j += 1
+            return j
+        j += 1
+    return None
+
+
+def tokenize(code):
+    """List of (kind, text) tokens; kind is one of "string", "regex", "comment",
+    "space", "word" and "punct".
+    """
+    tokens = []
+    previous = None  # last significant token
+    i = 0
+    n = len(code)
+    while i < n:
+        c = code[i]
+        if c in "'\"`":
+            j = _scan_quoted(code, i)
+            kind = "string"
+        elif code.startswith("//", i):
+            j = code.find("\n", i)
+            j = n if j < 0 else j
+            kind = "comment"
+        elif code.startswith("/*", i):
+            j = code.find("*/", i + 2)
+            j = n if j < 0 else j + 2
+            kind = "comment"
+        elif c == "/" and (
+            previous is None
+            or (previous[0] == "punct" and previous[1] in REGEX_PRECEDING_PUNCTUATION)
+            or (previous[0] == "word" and previous[1] in REGEX_PRECEDING_WORDS)
+        ) and _scan_regex(code, i) is not None:
+            j = _scan_regex(code, i)
+            kind = "regex"
+        elif c.isspace():
+            j = i + 1
+            while j < n and code[j].isspace():
+                j += 1
+            kind = "space"
+        elif _is_word_char(c):
+            j = i + 1
+            while j < n and _is_word_char(code[j]):
+                j += 1
+            kind = "word"
+        else:
+            j = i + 1
+            kind = "punct"
+        token = (kind, code[i:j])
+        tokens.append(token)
+        if kind not in ("space", "comment"):
+            previous = token
+        i = j
+    return tokens
+
+
+def _significant(tokens, i):
+    """Index of the first token at or after i which is not a space or a comment."""
+    while i < len(tokens) and tokens[i][0] in ("space", "comment"):
+        i += 1
+    return i
+
+
+def strip_console(code, methods=("log",)):
+    """Replace console.<method>(...) calls by void 0."""
+    tokens = tokenize(code)
+    result = []
+    i = 0
+    previous = None
+    while i < len(tokens):
+        kind, text = tokens[i]
+        if kind == "word" and text == "console" and previous != ("punct", "."):
+            dot = _significant(tokens, i + 1)
+            name = _significant(tokens, dot + 1)
+            paren = _significant(tokens, name + 1)
+            if (
+                paren < len(tokens)
+                and tokens[dot] == ("punct", ".")
+                and tokens[name][0] == "word"
+                and tokens[name][1] in methods
+                and tokens[paren] == ("punct", "(")
+            ):
+                depth = 0
+                j = paren
+                while j < len(tokens):
+                    if tokens[j][0] == "punct":
+                        if tokens[j][1] in "([{":
+                            depth += 1
+                        elif tokens[j][1] in ")]}":
+                            depth -= 1
+                            if depth == 0:
+                                break
+                    j += 1
+                if j < len(tokens):
+                    result.append("void 0")
+                    previous = ("word", "0")
+                    i = j + 1
+                    continue
+        result.append(text)
+        if kind not in ("space", "comment"):
+            previous = (kind, text)
+        i += 1
+    return "".join(result)
+
+
+def _needs_space(left, right):
+    if not left or not right:
+        return False
+    if _is_word_char(left[-1]) and _is_word_char(right[0]):
+        return True
+    # a + +b, a - -b, a / /re/
+    return left[-1] in "+-/" and right[0] == left[-1]
+
+
+def minify_js(code):
+    """Remove comments, indentation and blank lines (line breaks are kept)."""
+    tokens = [
+        ("space", "\n" if "\n" in text else " ") if kind == "comment" else (kind, text)
+        for kind, text in tokenize(code)
+    ]
+    result = []
+    for i, (kind, text) in enumerate(tokens):
+        if kind != "space":
+            result.append(text)
+            continue
+        left = result[-1] if result else ""
+        right = tokens[i + 1][1] if i + 1 < len(tokens) else ""
+        if "\n" in text:
+            if left and not left.endswith("\n") and right:
+                result.append("\n")
+        elif _needs_space(left, right):
+            result.append(" ")
+    return "".join(result).strip() + "\n"
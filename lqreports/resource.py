@@ -1,7 +1,11 @@
 from pathlib import Path
+from collections import OrderedDict
 import json
+import os
+import threading
 from lqreports.util import mimetype_from_extension, dataurl
 from lqreports.constants import LinkType
+import hashlib
 
 def resources_path():
     return Path(__file__).parent / "resources"
@@ -17,8 +21,68 @@ def resources_description():
             _resources_description = json.load(f)
     return _resources_description
 
+def resource_file_path(name):
+    return resources_path() / resources_description()[name]["filename"]
+
+
+class ResourceCache(object):
+    """Process-wide LRU cache of loaded and encoded resources.
+
+    Entries are keyed by (name, link type) and invalidated when the modification time
+    of the underlying file changes. Least recently used entries are evicted when the
+    total size exceeds max_size (bytes or characters).
+    """
+
+    def __init__(self, max_size=64 * 1024 * 1024):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, path, factory):
+        mtime = os.stat(path).st_mtime_ns
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == mtime:
+                self.entries.move_to_end(key)
+                return entry[1]
+        value = factory()
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old[1])
+            self.entries[key] = (mtime, value)
+            self.size += len(value)
+            while self.size > self.max_size and len(self.entries) > 1:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+_resource_cache = ResourceCache()
+
+
+def resource_cache():
+    return _resource_cache
+
+
 def load_resource(name):
-    return open(resources_path() / resources_description()[name]["filename"],"rb").read()
+    path = resource_file_path(name)
+
+    def load():
+        with open(path, "rb") as f:
+            return f.read()
+
+    return resource_cache().get((name, None), path, load)
+
+# Resources always linked by url (e.g. css referring to fonts by relative urls)
+EXTERNAL_RESOURCES = {"materialdesignicons"}
+
 
 class Resource(object):
     pass
@@ -27,7 +91,10 @@ class FileResource(Resource):
     def __init__(self, name):
         self.name = name
         self.description = resources_description()[name]
-        self.data = load_resource(name)
+
+    @property
+    def data(self):
+        return load_resource(self.name)
 
     @property
     def url(self):
@@ -45,11 +112,40 @@ class FileResource(Resource):
     def mimetype(self):
         return mimetype_from_extension(self.extension)
 
-    def link(self, link_type=LinkType.LINK):
-        if link_type == LinkType.LINK or self.name=="materialdesignicons":
+    @property
+    def external(self):
+        return self.name in EXTERNAL_RESOURCES
+
+    @property
+    def digest(self):
+        """sha256 of the resource content (hex)."""
+        return resource_cache().get(
+            (self.name, "digest"),
+            resource_file_path(self.name),
+            lambda: hashlib.sha256(self.data).hexdigest(),
+        )
+
+    @property
+    def static_filename(self):
+        """File name with a content hash, e.g. vue.0123456789abcdef.js"""
+        stem = self.filename[: -len(self.extension) - 1]
+        return f"{stem}.{self.digest[:16]}.{self.extension}"
+
+    def link(self, link_type=LinkType.LINK, static_dir="static"):
+        """Link to the resource. With LinkType.STATIC the link is a relative path
+        static_dir/static_filename; the file itself has to be copied there
+        (see RenderContext.resource_link).
+        """
+        if link_type == LinkType.LINK or self.external:
             return self.url
+        elif link_type == LinkType.STATIC:
+            return f"{static_dir}/{self.static_filename}"
         elif link_type == LinkType.DATAURL:
-            return dataurl(self.data, self.mimetype)
+            return resource_cache().get(
+                (self.name, link_type),
+                resource_file_path(self.name),
+                lambda: dataurl(self.data, self.mimetype),
+            )
         raise Exception(f"Unsupported link type: {link_type}")
 
 class LinkResource(Resource):
@@ -61,8 +157,9 @@ class LinkResource(Resource):
         self.filename = None
         self.extension = None
         self.mimetype = None
+        self.external = True
 
-    def link(self, link_type=LinkType.LINK):
+    def link(self, link_type=LinkType.LINK, static_dir="static"):
         return self.url
 
 if __name__ == "__main__":
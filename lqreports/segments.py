@@ -7,8 +7,85 @@ from io import BytesIO
 
 
 class RenderContext(object):
-    def __init__(self, link_type=LinkType.LINK):
+    """Options of a rendering.
+
+    link_type - how the resources are linked (see LinkType); with LinkType.STATIC
+        the resources are added to the assets in static_dir under content-hashed names
+    split_scripts - the Vue app code is emitted as a separate content-hashed .js file
+        (in script_dir, relative to the document) instead of an inline script;
+        the Vue data stay inline in the document
+    minify - remove comments and indentation from the generated javascript
+    strip_console - remove console.log calls from the generated javascript
+    production - production build profile: the hot methods (see VuetifyScript.add_method)
+        are rendered without console.log calls or replaced by their production variant
+
+    Files produced while rendering (like the split scripts) are collected in assets,
+    a dictionary of path relative to the document -> bytes; see write_assets.
+    """
+
+    def __init__(
+        self,
+        link_type=LinkType.LINK,
+        split_scripts=False,
+        minify=False,
+        strip_console=False,
+        script_dir="js",
+        static_dir="static",
+        production=False,
+    ):
         self.link_type = link_type
+        self.split_scripts = split_scripts
+        self.minify = minify
+        self.strip_console = strip_console
+        self.script_dir = script_dir
+        self.static_dir = static_dir
+        self.production = production
+        self.assets = {}
+
+    def process_script(self, code):
+        """Apply the minify and strip_console options to javascript code."""
+        from lqreports.minify import minify_js, strip_console
+
+        if self.strip_console:
+            code = strip_console(code)
+        if self.minify:
+            code = minify_js(code)
+        return code
+
+    def add_asset(self, directory, name, extension, data):
+        """Add a file named by a hash of its content; returns its relative path."""
+        import hashlib
+
+        digest = hashlib.sha256(data).hexdigest()[:16]
+        path = f"{directory}/{name}.{digest}.{extension}"
+        self.assets[path] = data
+        return path
+
+    def resource_link(self, resource):
+        """Link to a resource according to the link type."""
+        if self.link_type == LinkType.STATIC and not resource.external:
+            path = resource.link(LinkType.STATIC, static_dir=self.static_dir)
+            if path not in self.assets:
+                self.assets[path] = resource.data
+            return path
+        return resource.link(self.link_type)
+
+    def write_assets(self, folder):
+        """Write the assets into folder (the folder of the document).
+        Existing files are kept - with content-hashed names they are identical.
+        Returns the list of paths written.
+        """
+        from pathlib import Path
+
+        written = []
+        for path, data in self.assets.items():
+            p = Path(folder) / path
+            if p.exists():
+                continue
+            p.parent.mkdir(parents=True, exist_ok=True)
+            p.write_bytes(data)
+            written.append(str(p))
+        return written
 
 
 class Register(dict):
@@ -29,6 +106,19 @@ class Renderable(object):
     def render(self, render_context=None):
         return ""
 
+    def iter_render(self, render_context=None):
+        """Yield the rendered output as a sequence of string chunks."""
+        yield self.render(render_context)
+
+    def write(self, f, render_context=None):
+        """Stream the rendered output into a file-like object f."""
+        for chunk in self.iter_render(render_context):
+            f.write(chunk)
+
+    def iter_resources(self):
+        """Yield all resources linked from this renderable."""
+        return iter(())
+
 
 class Segment(Renderable):
     prefix = ""
@@ -69,22 +159,30 @@ class Segment(Renderable):
             resource = rs.FileResource(resource)
         return self.add(ResourceHtmlLink(resource), to_beginning=to_beginning)
 
-    def render(self, render_context=None):
-        txt = str(self.prefix)
+    def iter_render(self, render_context=None):
+        yield str(self.prefix)
         sep = ""
         for i, entry in enumerate(self.entries):
-            txt += sep
+            if sep:
+                yield sep
             sep = self.separator
             if isinstance(entry, str):
-                txt += entry
+                yield entry
             elif isinstance(entry, Renderable):
-                txt += entry.render(render_context)
+                yield from entry.iter_render(render_context)
             else:
                 raise Exception(
                     f"Unsupported entry type in {self.name}: {type(entry)}, entry number {i+1}"
                 )
-        txt += self.suffix
-        return txt
+        yield self.suffix
+
+    def render(self, render_context=None):
+        return "".join(self.iter_render(render_context))
+
+    def iter_resources(self):
+        for entry in self.entries:
+            if isinstance(entry, Renderable):
+                yield from entry.iter_resources()
 
 
 class ResourceHtmlLink(Renderable):
@@ -92,17 +190,84 @@ class ResourceHtmlLink(Renderable):
         self.resource = resource
         self.kind = resource.extension if kind is None else kind
 
+    def iter_resources(self):
+        yield self.resource
+
     def render(self, render_context):
         if self.kind == "css":
-            link = self.resource.link(render_context.link_type)
+            link = render_context.resource_link(self.resource)
             return f"""    <link href="{link}" rel="stylesheet">"""
         elif self.kind == "js":
-            link = self.resource.link(render_context.link_type)
+            link = render_context.resource_link(self.resource)
             return f"""    <script src="{link}"></script>"""
         else:
             raise Exception(f"Unsupported kind: {self.kind}")
 
 
+def table_schema(df, rowid_column=None):
+    """Schema of df in the pandas table orientation, optionally with a rowid column."""
+    import json
+
+    head = df.iloc[:0].copy()
+    if rowid_column is not None:
+        head.insert(0, rowid_column, np.arange(0))
+    return json.loads(head.to_json(orient="table"))["schema"]
+
+
+class DataFrameJson(Renderable):
+    """Dataframe serialized in the pandas table orientation (like to_json(orient="table")).
+
+    The rows are serialized in blocks of chunk_size rows while rendering, so the
+    dataframe is never copied as a whole. The rowid column (if requested) is
+    generated at serialization time.
+    """
+
+    def __init__(self, df, rowid_column=None, chunk_size=10000):
+        self.df = df
+        self.rowid_column = rowid_column
+        self.chunk_size = chunk_size
+
+    def iter_render(self, render_context=None):
+        import json
+
+        schema = table_schema(self.df, self.rowid_column)
+        yield '{"schema":' + json.dumps(schema, separators=(",", ":")) + ',"data":['
+        sep = ""
+        for start in range(0, len(self.df), self.chunk_size):
+            block = self.df.iloc[start : start + self.chunk_size].reset_index()
+            if self.rowid_column is not None:
+                block.insert(1, self.rowid_column, np.arange(start, start + len(block)))
+            records = block.to_json(orient="records", date_format="iso")
+            yield sep
+            yield records[1:-1]
+            sep = ","
+        yield "]}"
+
+    def render(self, render_context=None):
+        return "".join(self.iter_render(render_context))
+
+
+class ProfiledCode(Renderable):
+    """Javascript code depending on the build profile (RenderContext.production).
+
+    In the production profile production_code is rendered if specified,
+    otherwise the code without console.log calls.
+    """
+
+    def __init__(self, code, production_code=None):
+        self.code = code
+        self.production_code = production_code
+
+    def render(self, render_context=None):
+        if render_context is None or not render_context.production:
+            return self.code
+        if self.production_code is None:
+            from lqreports.minify import strip_console
+
+            self.production_code = strip_console(self.code)
+        return self.production_code
+
+
 class HtmlHeader(Segment):
     prefix = "  <head>\n"
     suffix = "\n  </head>"
@@ -170,11 +335,30 @@ class VuetifyPanel(Segment):
         show_select=False,
         single_select=True,
         row_action_icon="mdi-eye",
+        server_side=False,
+        virtual=False,
+        height=400,
+        row_height=48,
+        search_delay=300,
     ):
+        """Table of a dataframe (see VuetifyDocument.with_dataframe).
+
+        server_side - the rows are fetched page by page (dataframe added with lazy_url)
+        virtual - instead of a paginated table, only the visible rows of a scrolling
+            list of the given height are rendered (see virtual_dataframe_view)
+        """
+        if virtual:
+            if server_side:
+                raise ValueError("A virtual dataframe view can not be server side")
+            return self.virtual_dataframe_view(name, height, row_height, search_delay)
         code = ""
         if show_select:
             code += f""" show-select single-select='{"true" if single_select else "false"}' """
             code += """ v-model='selected' """
+        if server_side:
+            search_code = f""":server-items-length="{name}_total" :options.sync="{name}_options" :loading="{name}_loading" """
+        else:
+            search_code = """:search="search" """
 #        template_code = (
 #            """
 #        <template v-slot:item.rowid="{ item }">
@@ -187,12 +371,12 @@ class VuetifyPanel(Segment):
         <template v-slot:item.hours="props">
             <v-edit-dialog
             :return-value.sync="props.item.hours"
-            @save="save"
+            @save="save(props.item)"
             @cancel="cancel"
             @open="open"
             @close="close"
             >
-            {{format_hours(props.item.hours)}}
+            {{hours_text(props.item)}}
             <template v-slot:input>
                 <v-text-field
                 v-if="is_admin()"
@@ -223,7 +407,7 @@ class VuetifyPanel(Segment):
                 :items="{name}_data"
                 :items-per-page="{items_per_page}"
                 {attr}
-                :search="search"
+                {search_code}
             >
             {template_code}
             </v-data-table>
@@ -232,6 +416,221 @@ class VuetifyPanel(Segment):
             % code
         )
 
+    def virtual_dataframe_view(self, name="dataframe", height=400, row_height=48, search_delay=300):
+        """Scrolling table of a dataframe rendering only the visible rows (v-virtual-scroll).
+
+        The search uses an index with the lowercase text of every row, built once
+        when {name}_data is replaced. Rows changed in place (e.g. edited in the table)
+        must be passed to {name}_update_search_index. The query is split into tokens,
+        the rows containing all of them are kept. Typing is debounced by search_delay ms.
+        Clicking a header sorts by the column; numbers (also given as text) are compared
+        by value and empty values are sorted last.
+        """
+        script = self.register.vuetify_script
+        script.add_data(f"{name}_query", "")
+        script.add_data(f"{name}_matches", [])
+        script.add_data(f"{name}_sort_by", None)
+        script.add_data(f"{name}_sort_desc", False)
+        script.add_method(
+            f"{name}_search_text",
+            """
+        function(row, columns){
+            var values = [];
+            for (var j=0; j<columns.length; j++){
+                var value = row[columns[j]];
+                if (value!=null){
+                    values.push(String(value).toLowerCase());
+                }
+            }
+            return values.join("\\n");
+        }"""
+            % dict(name=name),
+        )
+        script.add_method(
+            f"{name}_build_search_index",
+            """
+        function(){
+            var rows = this.%(name)s_data || [];
+            var columns = this.%(name)s_headers.map(function(h){return h.value;});
+            var index = new Array(rows.length);
+            for (var i=0; i<rows.length; i++){
+                index[i] = this.%(name)s_search_text(rows[i], columns);
+            }
+            // Not reactive - the index is only read by %(name)s_search
+            this.%(name)s_search_index = index;
+            this.%(name)s_search();
+        }"""
+            % dict(name=name),
+        )
+        script.add_method(
+            f"{name}_update_search_index",
+            """
+        function(rows){
+            var data = this.%(name)s_data || [];
+            var index = this.%(name)s_search_index;
+            if (index==null || index.length!=data.length){
+                this.%(name)s_build_search_index();
+                return;
+            }
+            var columns = this.%(name)s_headers.map(function(h){return h.value;});
+            for (var i=0; i<rows.length; i++){
+                var position = data.indexOf(rows[i]);
+                if (position<0){
+                    this.%(name)s_build_search_index();
+                    return;
+                }
+                index[position] = this.%(name)s_search_text(rows[i], columns);
+            }
+            this.%(name)s_search();
+        }"""
+            % dict(name=name),
+        )
+        script.add_method(
+            f"{name}_search",
+            """
+        function(){
+            var rows = this.%(name)s_data || [];
+            var index = this.%(name)s_search_index || [];
+            var tokens = (this.%(name)s_query || "").toLowerCase().split(/\\s+/).filter(function(t){
+                return t.length>0;
+            });
+            if (tokens.length==0 || index.length!=rows.length){
+                this.%(name)s_matches = rows;
+                return;
+            }
+            var matches = [];
+            for (var i=0; i<rows.length; i++){
+                var text = index[i];
+                var found = true;
+                for (var j=0; j<tokens.length; j++){
+                    if (text.indexOf(tokens[j])<0){
+                        found = false;
+                        break;
+                    }
+                }
+                if (found){
+                    matches.push(rows[i]);
+                }
+            }
+            this.%(name)s_matches = matches;
+        }"""
+            % dict(name=name),
+        )
+        script.add_method(
+            f"{name}_sort",
+            """
+        function(column){
+            if (this.%(name)s_sort_by==column){
+                this.%(name)s_sort_desc = !this.%(name)s_sort_desc;
+            }
+            else{
+                this.%(name)s_sort_by = column;
+                this.%(name)s_sort_desc = false;
+            }
+        }"""
+            % dict(name=name),
+        )
+        script.add_computed(
+            f"{name}_view",
+            """
+            var rows = this.%(name)s_matches;
+            var column = this.%(name)s_sort_by;
+            if (column==null){
+                return rows;
+            }
+            var order = this.%(name)s_sort_desc ? -1 : 1;
+            function empty(value){
+                return value==null || value==="";
+            }
+            function numeric(value){
+                return typeof value=="number" || (typeof value=="string" && value.trim()!=="" && isFinite(value));
+            }
+            return rows.slice().sort(function(a, b){
+                var x = a[column];
+                var y = b[column];
+                // Empty values last in both orders, numbers (also as text) by value
+                if (empty(x) || empty(y)){
+                    return empty(x) ? (empty(y) ? 0 : 1) : -1;
+                }
+                if (numeric(x) && numeric(y)){
+                    x = Number(x);
+                    y = Number(y);
+                }
+                else{
+                    x = String(x);
+                    y = String(y);
+                }
+                return (x<y ? -1 : (x>y ? 1 : 0))*order;
+            });
+        """
+            % dict(name=name),
+        )
+        script.add_watch(f"{name}_data", "function(){this.%s_build_search_index();}" % name)
+        script.add_watch(
+            f"{name}_query",
+            "function(){clearTimeout(this.%(name)s_search_timer);this.%(name)s_search_timer=setTimeout(this.%(name)s_search, %(delay)d);}"
+            % dict(name=name, delay=search_delay),
+        )
+        self.add(
+            """
+        <v-card>
+            <v-card-title>
+            <v-text-field
+                v-model="%(name)s_query"
+                append-icon="mdi-magnify"
+                label="Search"
+                single-line
+                hide-details
+            ></v-text-field>
+            </v-card-title>
+            <div class="d-flex px-4 font-weight-bold" style="height:%(row_height)dpx;align-items:center">
+                <div
+                    v-for="header in %(name)s_headers"
+                    :key="header.value"
+                    class="text-truncate"
+                    style="flex:1 1 0;cursor:pointer"
+                    @click="%(name)s_sort(header.value)"
+                >
+                    {{header.text}}
+                    <v-icon v-if="%(name)s_sort_by==header.value" small>{{%(name)s_sort_desc ? 'mdi-arrow-down' : 'mdi-arrow-up'}}</v-icon>
+                </div>
+            </div>
+            <v-divider></v-divider>
+            <v-virtual-scroll :items="%(name)s_view" :item-height="%(row_height)d" height="%(height)d" bench="5">
+                <template v-slot:default="{ item }">
+                <div class="d-flex px-4" style="height:%(row_height)dpx;align-items:center;border-bottom:thin solid rgba(0,0,0,.12)">
+                    <div v-for="header in %(name)s_headers" :key="header.value" class="text-truncate" style="flex:1 1 0">
+                        <v-edit-dialog
+                        v-if="header.value=='hours'"
+                        :return-value.sync="item.hours"
+                        @save="save(item)"
+                        @cancel="cancel"
+                        @open="open"
+                        @close="close"
+                        >
+                        {{hours_text(item)}}
+                        <template v-slot:input>
+                            <v-text-field
+                            v-if="is_admin()"
+                            v-model="item.hours"
+                            label="Edit"
+                            single-line
+                            ></v-text-field>
+                            <v-btn v-if="!is_admin()" @click="show_panel('admin_panel')">Login</v-btn>
+                        </template>
+                        </v-edit-dialog>
+                        <template v-else>{{item[header.value]}}</template>
+                    </div>
+                </div>
+                </template>
+            </v-virtual-scroll>
+            <v-card-text class="py-2">{{%(name)s_view.length}} rows</v-card-text>
+        </v-card>
+        """
+            % dict(name=name, height=height, row_height=row_height)
+        )
+        return self
+
     def row_detail(self, title_index=1):
         import html
 
@@ -445,10 +844,12 @@ class VuetifyComponent(Segment):
 
 
 class VuetifyScript(Segment):
+    prefix = "    <script>\n"
+    suffix = "    </script>\n"
+
     def __init__(self, register):
         super().__init__("vuetify_script", register)
         r = self.register
-        self.add("    <script>\n")
         self.add(Segment("before_init_vue", r))
         self.add(Segment("init_vue", r))
         self.add(Segment("vue_components", r))
@@ -461,15 +862,15 @@ class VuetifyScript(Segment):
             iconfont: 'mdi', // 'mdi' || 'mdiSvg' || 'md' || 'fa' || 'fa4' || 'faSvg'
         },
       }),
-      data: {
 """
         )
-        vue_data = Segment("vue_data", r, separator=",\n")
-        self.add(vue_data)
+        vue_data_block = Segment(
+            "vue_data_block", r, prefix="      data: {\n", suffix="\n      },\n"
+        )
+        vue_data_block.add(Segment("vue_data", r, separator=",\n"))
+        self.add(vue_data_block)
         self.add(
-            """
-      },
-      methods: {
+            """      methods: {
 """
         )
         self.add(Segment("vue_methods", r, separator=",\n"))
@@ -507,7 +908,40 @@ class VuetifyScript(Segment):
 """
         )
         self.add(Segment("init_vue_after", r))
-        self.add("    </script>\n")
+
+    def iter_code(self, render_context=None, data_code=None):
+        """Yield the javascript code (without the script tags).
+        If data_code is specified, it replaces the data property of the Vue app.
+        """
+        for entry in self.entries:
+            if isinstance(entry, str):
+                yield entry
+            elif data_code is not None and entry is self.register.vue_data_block:
+                yield data_code
+            else:
+                yield from entry.iter_render(render_context)
+
+    def iter_render(self, render_context=None):
+        ctx = render_context
+        if ctx is None or not (ctx.split_scripts or ctx.minify or ctx.strip_console):
+            yield from super().iter_render(render_context)
+            return
+        if ctx.split_scripts:
+            # Data stay in the document, the code goes to a file cacheable for a long time
+            yield "    <script>\n      var lqreports_vue_data = {\n"
+            yield from self.register.vue_data.iter_render(render_context)
+            yield "\n      };\n    </script>\n"
+            code = "".join(
+                self.iter_code(render_context, data_code="      data: lqreports_vue_data,\n")
+            )
+            path = ctx.add_asset(
+                ctx.script_dir, "app", "js", ctx.process_script(code).encode("utf-8")
+            )
+            yield f"""    <script src="{path}"></script>\n"""
+        else:
+            yield self.prefix
+            yield ctx.process_script("".join(self.iter_code(render_context)))
+            yield self.suffix
 
     def add_data(self, name, value=None, raw=False):
         import json
@@ -529,8 +963,20 @@ class VuetifyScript(Segment):
                 self.register.vue_data.add(f"        {name}: {value}")
         return self
 
-    def add_method(self, name, function):
-        self.register.vue_methods.add(f"        {name}: {function}")
+    def add_method(self, name, function, hot=False, production_function=None):
+        """Add a Vue method.
+        Methods called while rendering (e.g. from template expressions) should be marked
+        as hot: in the production profile (RenderContext.production) they are rendered
+        as production_function if specified, otherwise without console.log calls.
+        """
+        code = f"        {name}: {function}"
+        if hot or production_function is not None:
+            production_code = None
+            if production_function is not None:
+                production_code = f"        {name}: {production_function}"
+            self.register.vue_methods.add(ProfiledCode(code, production_code))
+        else:
+            self.register.vue_methods.add(code)
         return self
 
     def add_computed(self, name, get_code, set_code=None):
@@ -612,7 +1058,8 @@ class VuetifyDashboard(VuetifyDocument):
             this.store();
             this.dataframe_json="";
             this.names_json="";
-        }"""
+        }""",
+            hot=True,
         )
         self.panel("home_panel")
         return self
@@ -834,27 +1281,117 @@ Vue.component("plotly-chart", {
         )
         return self
 
+    def with_columnar_decoder(self):
+        r = self.register
+        if "columnar_decoder" not in r:
+            from lqreports.columnar import JS_DECODER
+
+            r.before_init_vue.add(Segment("columnar_decoder", r).add(JS_DECODER))
+        return self
+
     def with_dataframe(
-        self, df, name="dataframe", labels=None, with_rowid=True, rowid_column="rowid"
+        self,
+        df,
+        name="dataframe",
+        labels=None,
+        with_rowid=True,
+        rowid_column="rowid",
+        columnar=False,
+        encodings=None,
+        lazy_url=None,
     ):
+        """Add a dataframe to the vue data.
+
+        With columnar=True the rows are embedded in the compact columnar format
+        (see lqreports.columnar). With lazy_url only the schema and headers are
+        embedded; the rows are fetched page by page from lazy_url, which receives
+        page, items_per_page, sort_by, sort_desc and search parameters (plus the
+        content of {name}_filter) and returns {"total":..., "data":[...]}.
+        Use dataframe_view(server_side=True) to display such a dataframe.
+        """
         if labels is None:
             labels = list(df.columns)
         if with_rowid:
             assert rowid_column not in df.columns
-            columns = [rowid_column] + [c for c in df.columns]
-            df = df.copy()
-            df[rowid_column] = np.arange(len(df))
-            df = df[columns]
             labels = [rowid_column] + labels
+        else:
+            rowid_column = None
         self.df = df
         self.labels = labels
         r = self.register
         script = r.vuetify_script
-        script.add_data(name, df.to_json(orient="table"), raw=True)
+        if lazy_url is not None:
+            import json
+
+            schema = table_schema(df, rowid_column)
+            script.add_data(name, json.dumps(dict(schema=schema, data=[])), raw=True)
+            script.add_data(f"{name}_total", 0)
+            script.add_data(f"{name}_loading", False)
+            script.add_data(f"{name}_options", {})
+            script.add_data(f"{name}_filter", {})
+            script.add_data(f"{name}_request", 0)
+            script.add_method(
+                f"{name}_fetch",
+                """
+        function(){
+            var o = this.%(name)s_options;
+            var params = Object.assign({}, this.%(name)s_filter, {
+                page: o.page || 1,
+                items_per_page: o.itemsPerPage || 10,
+                sort_by: (o.sortBy || []).join(","),
+                sort_desc: (o.sortDesc || []).join(","),
+                search: this.search || ""
+            });
+            var request = ++this.%(name)s_request;
+            this.%(name)s_loading = true;
+            this.$http.get("%(url)s", {params: params}).then(function (response) {
+                response.json().then(function (data) {
+                    if (request == this.%(name)s_request){
+                        this.%(name)s_data = data.data;
+                        this.%(name)s_total = data.total;
+                        this.%(name)s_loading = false;
+                    }
+                }.bind(this));
+            }.bind(this), function (reason) {
+                this.%(name)s_loading = false;
+                console.log("Error fetching %(name)s", reason);
+            }.bind(this));
+        }"""
+                % dict(name=name, url=lazy_url),
+            )
+            script.add_watch(
+                f"{name}_options",
+                "{handler: function(){this.%s_fetch();}, deep: true}" % name,
+            )
+            script.add_watch(
+                f"{name}_filter",
+                "{handler: function(){this.%s_fetch();}, deep: true}" % name,
+            )
+            script.add_watch("search", "function(){this.%s_fetch();}" % name)
+        elif columnar:
+            import json
+            import lqreports.columnar as col
+
+            self.with_columnar_decoder()
+            schema = table_schema(df, rowid_column)
+            script.add_data(name, json.dumps(dict(schema=schema, data=[])), raw=True)
+            payload = col.encode_dataframe(df, encodings, rowid_column=rowid_column)
+            script.add_data(f"{name}_columnar", col.dumps(payload), raw=True)
+            script.add_created(
+                f"this.{name}.data=lqreports_decode_columnar(this.{name}_columnar);\n"
+                f"this.{name}_columnar=null;\n"
+            )
+        else:
+            r.vue_data.add(
+                Segment(f"{name}__json", r, prefix=f"        {name}: ").add(
+                    DataFrameJson(df, rowid_column)
+                )
+            )
         script.add_data("search", "")
         script.add_data("selected", [])
         script.add_data(f"{name}_data", [])
-        script.add_created(f"this.{name}_data=this.{name}.data;\n")
+        if lazy_url is None:
+            script.add_created(f"this.{name}_data=this.{name}.data;\n")
         script.add_data(
             f"{name}_headers",
             [
@@ -1,19 +1,197 @@
-var staticCacheName = "hours3";
-  
-self.addEventListener("install", function (e) {
-  e.waitUntil(
-    caches.open(staticCacheName).then(function (cache) {
-      return cache.addAll(["/"]);
+var CACHE_PREFIX = "hours3-";
+var CACHE_NAME = CACHE_PREFIX + "971777367bf89349";
+var DATA_CACHE_NAME = CACHE_PREFIX + "data";
+var PRECACHE = [
+  {
+    "url": "index.html",
+    "hash": "972203d7faa216c681866e3054df02e0ff87dc8773157a4109811398c25af67e"
+  },
+  {
+    "url": "https://cdn.jsdelivr.net/npm/@mdi/font@4.9.95/css/materialdesignicons.min.css",
+    "hash": "a2b84598b7408a49f572ff743dc5886bddd5390c78b40416037da19c13f8d0ce"
+  },
+  {
+    "url": "https://cdn.jsdelivr.net/npm/vuetify@2.4.3/dist/vuetify.min.css",
+    "hash": "ecc527ce6644526eb9a778254fb89a9bd10e6dc067f14960132a2dcb5fea41ae"
+  },
+  {
+    "url": "https://cdn.jsdelivr.net/npm/vue@2.6.12/dist/vue.js",
+    "hash": "159f0ac0c8f517aaa736003b6e13ebc959b5f7129db87e4e56bf2eec8d6d02d7"
+  },
+  {
+    "url": "https://cdn.jsdelivr.net/npm/vue-resource@1.5.1",
+    "hash": "7bd5b12d1e0338fe5728c4f899f957568bd94b89957623240054831c5fbaabcd"
+  },
+  {
+    "url": "https://cdn.jsdelivr.net/npm/vuetify@2.4.3/dist/vuetify.js",
+    "hash": "dfa1a4fe6cf4bc9fc92e2a49e1f9a669606b2c9c8d8ca6d875a02776be8b55f5"
+  }
+];
+var DATA_URLS = ["/hours/api/columnar", "/hours/api/overview", "/liquer/api/store/data/data/hours_dataframe.json", "/liquer/api/store/data/data/hours_names.json", "/liquer/api/store/data/data/hours_columnar.json"];
+
+    var HOURS_OUTBOX_DB = "hours3-outbox";
+    var HOURS_EVENTS_URL = "/hours/api/events";
+    var HOURS_SYNC_TAG = "hours-events";
+
+    function outbox_open(){
+      return new Promise(function (resolve, reject) {
+        var request = indexedDB.open(HOURS_OUTBOX_DB, 1);
+        request.onupgradeneeded = function () {
+          request.result.createObjectStore("events", {keyPath: "id"});
+        };
+        request.onsuccess = function () { resolve(request.result); };
+        request.onerror = function () { reject(request.error); };
+      });
+    }
+
+    function outbox_transaction(mode, action){
+      return outbox_open().then(function (db) {
+        return new Promise(function (resolve, reject) {
+          var tx = db.transaction("events", mode);
+          var result = action(tx.objectStore("events"));
+          tx.oncomplete = function () { resolve(result.result); };
+          tx.onerror = function () { reject(tx.error); };
+        });
+      });
+    }
+
+    function outbox_put(events){
+      return outbox_transaction("readwrite", function (store) {
+        events.forEach(function (event) { store.put(event); });
+        return {};
+      });
+    }
+
+    function outbox_all(){
+      return outbox_transaction("readonly", function (store) {
+        return store.getAll();
+      }).then(function (events) {
+        return events.sort(function (a, b) { return a.time - b.time; });
+      });
+    }
+
+    function outbox_delete(ids){
+      return outbox_transaction("readwrite", function (store) {
+        ids.forEach(function (id) { store.delete(id); });
+        return {};
+      });
+    }
+
+    function outbox_delete_rows(uids){
+      // Delete the queued events of rows synchronized otherwise (newer than the events)
+      var synced = {};
+      uids.forEach(function (uid) { synced[uid] = true; });
+      return outbox_all().then(function (events) {
+        var ids = events.filter(function (e) {
+          return e.row.uid && synced[e.row.uid]===true;
+        }).map(function (e) { return e.id; });
+        return ids.length ? outbox_delete(ids) : {};
+      });
+    }
+
+    function outbox_drain(){
+      return outbox_all().then(function (events) {
+        if (!events.length){
+          return 0;
+        }
+        return fetch(HOURS_EVENTS_URL, {
+          method: "POST",
+          headers: {"Content-Type": "application/json"},
+          body: JSON.stringify({events: events})
+        }).then(function (response) {
+          if (!response.ok){
+            throw new Error("Sending queued events failed: " + response.status);
+          }
+          return response.json();
+        }).then(function (result) {
+          // Rejected events would be rejected again, they are dropped with the sent ones
+          if (result.rejected && result.rejected.length){
+            console.log("Dropped rejected queued events", result.rejected, result.errors);
+          }
+          return outbox_delete(events.map(function (e) { return e.id; })).then(function () {
+            return events.length;
+          });
+        });
+      });
+    }
+
+self.addEventListener("sync", function (event) {
+  if (event.tag == HOURS_SYNC_TAG) {
+    event.waitUntil(outbox_drain());
+  }
+});
+
+self.addEventListener("install", function (event) {
+  event.waitUntil(
+    caches.open(CACHE_NAME).then(function (cache) {
+      return Promise.all(PRECACHE.map(function (entry) {
+        var url = new URL(entry.url, self.location);
+        var request = new Request(url.href, {mode: url.origin == self.location.origin ? "same-origin" : "no-cors"});
+        return fetch(request).then(function (response) {
+          return cache.put(url.href, response);
+        });
+      }));
+    }).then(function () {
+      return self.skipWaiting();
     })
   );
 });
-  
+
+self.addEventListener("activate", function (event) {
+  event.waitUntil(
+    caches.keys().then(function (keys) {
+      return Promise.all(keys.filter(function (key) {
+        return key.indexOf(CACHE_PREFIX) == 0 && key != CACHE_NAME && key != DATA_CACHE_NAME;
+      }).map(function (key) {
+        return caches.delete(key);
+      }));
+    }).then(function () {
+      return self.clients.claim();
+    })
+  );
+});
+
+function is_data(url) {
+  return url.origin == self.location.origin && DATA_URLS.indexOf(url.pathname) >= 0;
+}
+
+// Live data: from the network (conditional requests reach the server and may
+// get 304), the last 200 response is kept for offline use only.
+function network_first(event) {
+  return caches.open(DATA_CACHE_NAME).then(function (cache) {
+    return fetch(event.request).then(function (response) {
+      if (response.status == 200) {
+        cache.put(event.request, response.clone());
+      }
+      return response;
+    }, function (reason) {
+      return cache.match(event.request).then(function (cached) {
+        if (cached) {
+          return cached;
+        }
+        throw reason;
+      });
+    });
+  });
+}
+
 self.addEventListener("fetch", function (event) {
-  console.log(event.request.url);
-  
+  if (event.request.method != "GET") {
+    return;
+  }
+  var url = new URL(event.request.url);
+  if (url.pathname.indexOf("/hours/api/changes") == 0) {
+    return;  // live change stream, never cached
+  }
+  if (is_data(url)) {
+    event.respondWith(network_first(event));
+    return;
+  }
   event.respondWith(
-    caches.match(event.request).then(function (response) {
-      return response || fetch(event.request);
+    caches.open(CACHE_NAME).then(function (cache) {
+      return cache.match(event.request).then(function (response) {
+        return response || fetch(event.request);
+      });
     })
   );
-});
\ No newline at end of file
+});
@@ -0,0 +1,34 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from lqhours.store import open_store  # noqa: E402
+
+
+@pytest.fixture(params=["sqlite", "json"])
+def backend(request):
+    return request.param
+
+
+@pytest.fixture
+def store(tmp_path, backend):
+    return open_store(tmp_path / "data", backend=backend)
+
+
+def hours_row(uid, name="A", day=1, end=True, rowid=-1, **kwargs):
+    """A stopped (or started if end is False) hours row of a new client row."""
+    row = dict(
+        uid=uid,
+        rowid=rowid,
+        name=name,
+        year=2026,
+        month=1,
+        start=f"2026-01-{day:02d}T08:00:00Z",
+        end=f"2026-01-{day:02d}T10:00:00Z" if end else "",
+        hours=2.0 if end else 0.0,
+    )
+    row.update(kwargs)
+    return row
@@ -0,0 +1,99 @@
+import gzip
+import importlib
+import json
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+from lqhours.columnar import decode_hours
+
+from conftest import hours_row
+
+APP_PATH = Path(__file__).resolve().parent.parent / "app"
+
+
+@pytest.fixture(scope="module")
+def hours(tmp_path_factory):
+    """The hours app module with its data folder in a temporary directory."""
+    pytest.importorskip("liquer")
+    folder = tmp_path_factory.mktemp("app")
+    (folder / "data").mkdir()
+    cwd = os.getcwd()
+    os.chdir(folder)
+    sys.path.insert(0, str(APP_PATH))
+    try:
+        yield importlib.import_module("hours")
+    finally:
+        sys.path.remove(str(APP_PATH))
+        os.chdir(cwd)
+
+
+@pytest.fixture
+def client(hours):
+    return hours.app.test_client()
+
+
+def test_sync_and_columnar(client):
+    response = client.post(
+        "/hours/api/sync", data=json.dumps(dict(rows=[hours_row("s1")], names=["A"]))
+    )
+    assert response.status_code == 200
+    rowid = response.get_json()["rowids"]["s1"]
+    payload = client.get("/hours/api/columnar").get_json()
+    rows = {row["uid"]: row for row in decode_hours(payload)["data"]}
+    assert rows["s1"]["rowid"] == rowid
+    assert payload["position"]
+    assert client.get("/liquer/api/store/data/data/hours_names.json").get_json() == ["A"]
+
+
+def test_conditional_and_compressed_responses(client):
+    client.post(
+        "/hours/api/sync",
+        data=json.dumps(dict(rows=[hours_row(f"c{i}", day=i % 28 + 1) for i in range(50)])),
+    )
+    url = "/liquer/api/store/data/data/hours_dataframe.json"
+    response = client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert len(json.loads(gzip.decompress(response.data))["data"]) >= 50
+    etag = response.headers["ETag"]
+    assert etag.endswith('-gzip"')
+    response = client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 304
+    client.post("/hours/api/sync", data=json.dumps(dict(rows=[hours_row("c0", name="B")])))
+    response = client.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": etag})
+    assert response.status_code == 200
+
+
+def test_events(client):
+    events = [
+        dict(id="app-e1", type="start", time=1, row=hours_row("e1", end=False)),
+        dict(id="app-e2", type="stop", time=2, row=hours_row("e2", end=False)),
+    ]
+    result = client.post("/hours/api/events", json=dict(events=events)).get_json()
+    assert (result["accepted"], result["rejected"]) == (1, ["app-e2"])
+    result = client.post("/hours/api/events", json=dict(events=events)).get_json()
+    assert (result["accepted"], result["duplicates"]) == (0, 1)
+    assert client.post("/hours/api/events", json=dict(events=5)).status_code == 400
+
+
+def test_changes_poll(client):
+    position = client.get("/hours/api/columnar").get_json()["position"]
+    client.post("/hours/api/sync", data=json.dumps(dict(rows=[hours_row("p1")])))
+    result = client.get(f"/hours/api/changes/poll?position={position}&timeout=0").get_json()
+    assert [event["type"] for event in result["events"]] == ["rows"]
+    assert result["events"][0]["data"][0]["uid"] == "p1"
+    assert result["position"] == client.get("/hours/api/columnar").get_json()["position"]
+
+
+def test_report_and_export(client):
+    client.post("/hours/api/sync", data=json.dumps(dict(rows=[hours_row("r1", name="R")])))
+    report = client.get("/hours/api/report/user_summary").get_json()
+    assert "R" in [row["name"] for row in report]
+    assert client.get("/hours/api/report/unknown").status_code == 404
+    response = client.get("/hours/api/export/hours_data/monthly_summary/monthly.csv")
+    assert response.status_code == 200
+    assert response.data.startswith(b"name,")
+    assert client.get("/hours/api/export/hours_data/no_such_command/x.csv").status_code == 400
+    assert client.get("/hours/api/export/hours_data/x.doc").status_code == 400
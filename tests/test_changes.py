@@ -0,0 +1,69 @@
+import threading
+import time
+
+from lqhours.changes import ChangeFeed
+from lqhours.store import open_store
+
+from conftest import hours_row
+
+
+def test_changes_since_position(store):
+    feed = ChangeFeed(store)
+    position = feed.position()
+    assert feed.since(position) == []
+    store.apply_rows([hours_row("a", end=False)])
+    store.apply_rows([hours_row("a")])
+    events = feed.since(position)
+    assert [(event_type, [row["end"] for row in rows]) for _, event_type, rows in events] == [
+        ("rows", [""]),
+        ("rows", ["2026-01-01T10:00:00Z"]),
+    ]
+    # Every event continues from the position of the previous one
+    assert feed.since(events[0][0]) == events[1:]
+    assert feed.since(events[-1][0]) == []
+    assert events[-1][0] == feed.position()
+
+
+def test_replaced_data_reloads(store):
+    feed = ChangeFeed(store)
+    position = feed.position()
+    store.apply_rows([hours_row("a")])
+    store.store_names(["A", "B"])
+    assert [event_type for _, event_type, _ in feed.since(position)] == ["reload"]
+    position = feed.position()
+    store.store_dataframe(dict(data=[hours_row("b", rowid=0)]))
+    assert [event_type for _, event_type, _ in feed.since(position)] == ["reload"]
+
+
+def test_unknown_position_reloads(store):
+    feed = ChangeFeed(store)
+    [(position, event_type, _)] = feed.since("unknown")
+    assert event_type == "reload"
+    assert position == feed.position()
+
+
+def test_changes_timeout(store):
+    feed = ChangeFeed(store, interval=0.05)
+    position = feed.position()
+    assert feed.changes(position, timeout=0.1) == ([], position)
+
+
+def test_changes_wake_on_write(store):
+    feed = ChangeFeed(store, interval=10)
+    position = feed.position()
+    threading.Timer(0.1, store.apply_rows, [[hours_row("a")]]).start()
+    started = time.monotonic()
+    events, after = feed.changes(position, timeout=5)
+    assert time.monotonic() - started < 5
+    assert [event_type for _, event_type, _ in events] == ["rows"]
+    assert after == events[-1][0]
+
+
+def test_changes_of_another_process(tmp_path):
+    # Stores of two worker processes sharing the SQLite database
+    writer = open_store(tmp_path, backend="sqlite")
+    feed = ChangeFeed(open_store(tmp_path, backend="sqlite"), interval=0.05)
+    position = feed.position()
+    threading.Timer(0.1, writer.apply_rows, [[hours_row("a")]]).start()
+    events, _ = feed.changes(position, timeout=5)
+    assert [(event_type, rows[0]["uid"]) for _, event_type, rows in events] == [("rows", "a")]
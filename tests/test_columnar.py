@@ -0,0 +1,63 @@
+import json
+
+import pandas as pd
+
+from lqreports import columnar as col
+from lqhours.columnar import (
+    decode_hours,
+    decode_hours_dataframe,
+    encode_hours,
+    encode_hours_dataframe,
+)
+
+
+ROWS = [
+    dict(rowid=3, uid="a", name="A", year=2026, month=1, start="2026-01-01T08:00:00.000Z",
+         end="2026-01-01T10:30:00.000Z", hours=2.5, updated=1767254400000.0),
+    dict(rowid=1, uid="b", name="B", year=2026, month=1, start="2026-01-02T08:00:00.000Z",
+         end="", hours=0.0, updated=None),
+    dict(rowid=7, uid=None, name=None, year=None, month=None, start="2025-12-31T23:00:00.000Z",
+         end="", hours=None, updated=None),
+]
+
+
+def test_hours_rows_round_trip():
+    payload = json.loads(col.dumps(encode_hours(ROWS)))
+    assert payload["version"] == col.COLUMNAR_VERSION
+    rows = decode_hours(payload)["data"]
+    assert [{k: v for k, v in row.items() if k != "index"} for row in rows] == ROWS
+    assert [row["index"] for row in rows] == [0, 1, 2]
+
+
+def test_delta_columns():
+    payload = encode_hours(ROWS)
+    assert payload["columns"]["rowid"] == dict(encoding="int_delta", values=[3, -2, 6])
+    assert col.delta_decode(col.delta_encode([5, None, 7, 4])) == [5, None, 7, 4]
+
+
+def test_dataframe_encoding_matches_rows():
+    df = pd.DataFrame(ROWS)
+    df["start"] = pd.to_datetime(df["start"], utc=True)
+    df["end"] = pd.to_datetime(df["end"].replace("", None), utc=True)
+    payload = json.loads(col.dumps(encode_hours_dataframe(df)))
+    assert payload["columns"] == encode_hours(ROWS)["columns"]
+    decoded = decode_hours_dataframe(payload)
+    assert decoded["start"].tolist() == df["start"].tolist()
+    assert decoded["end"].isna().tolist() == [False, True, True]
+    assert decoded["rowid"].tolist() == [3, 1, 7]
+
+
+def test_version_1_payload():
+    payload = dict(
+        format="columnar",
+        version=1,
+        length=2,
+        columns=dict(
+            rowid=dict(encoding="int", values=[0, 1]),
+            start=dict(encoding="epoch", values=[1617271200, None]),
+        ),
+    )
+    assert col.decode_rows(payload) == [
+        dict(rowid=0, start="2021-04-01T10:00:00.000Z"),
+        dict(rowid=1, start=""),
+    ]
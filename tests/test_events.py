@@ -0,0 +1,79 @@
+import pytest
+
+from lqhours.events import validate_events
+
+from conftest import hours_row
+
+
+def event(event_id, row, type=None, time=None):
+    if type is None:
+        type = "start" if row["end"] == "" else "stop"
+    return dict(id=event_id, type=type, time=time, row=row)
+
+
+def test_validate_events_orders_and_dedupes():
+    df, rejected = validate_events(
+        [
+            event("b", hours_row("a"), time=2000),
+            event("a", hours_row("a", end=False), time=1000),
+            event("b", hours_row("a"), time=3000),
+            event("c", hours_row("c")),
+        ]
+    )
+    assert rejected == []
+    assert df["id"].tolist() == ["a", "b", "c"]
+
+
+def test_invalid_events_are_rejected_individually():
+    df, rejected = validate_events(
+        [
+            event("ok", hours_row("a")),
+            event("stop", hours_row("b", end=False), type="stop"),
+            dict(id="norow"),
+            event("name", hours_row("c", name="")),
+        ]
+    )
+    assert df["id"].tolist() == ["ok"]
+    assert {r["id"]: r["errors"] for r in rejected} == {
+        "norow": ["not an object with a row"],
+        "stop": ["stop event without end"],
+        "name": ["missing name"],
+    }
+
+
+def test_batch_must_be_a_list():
+    with pytest.raises(ValueError):
+        validate_events({"events": []})
+
+
+def test_resent_batch_is_applied_once(store):
+    events = [
+        event("e1", hours_row("a", end=False), time=1000),
+        event("e2", hours_row("a"), time=2000),
+    ]
+    result = store.apply_events(events)
+    assert (result["accepted"], result["duplicates"], result["rowids"]) == (2, 0, {"a": 0})
+    result = store.apply_events(events + [event("e3", hours_row("b"), time=3000)])
+    assert (result["accepted"], result["duplicates"]) == (1, 2)
+    rows = store.dataframe()["data"]
+    assert [(row["uid"], row["rowid"], row["end"] != "") for row in rows] == [
+        ("a", 0, True),
+        ("b", 1, True),
+    ]
+
+
+def test_rejected_events_do_not_block_the_batch(store):
+    result = store.apply_events(
+        [event("bad", hours_row("a", end=False), type="stop"), event("good", hours_row("b"))]
+    )
+    assert result["accepted"] == 1
+    assert result["rejected"] == ["bad"]
+    assert [row["uid"] for row in store.dataframe()["data"]] == ["b"]
+
+
+def test_queued_event_does_not_revert_a_newer_row(store):
+    # Stopped and synchronized while a start queued offline was waiting
+    store.apply_rows([hours_row("a", updated=2000)])
+    result = store.apply_events([event("start", hours_row("a", end=False), time=1000)])
+    assert (result["accepted"], result["stale"]) == (1, 1)
+    assert store.dataframe()["data"][0]["end"] != ""
@@ -0,0 +1,57 @@
+import pytest
+
+from lqreports.minify import minify_js, strip_console, tokenize
+
+
+def test_strip_console_log():
+    assert strip_console('f(); console.log("a", g(1), [2]); h();') == "f(); void 0; h();"
+
+
+def test_strip_console_keeps_strings_and_other_methods():
+    code = 'var s = "console.log(1)"; console.warn(s); x.console.log(s);'
+    assert strip_console(code) == code
+    assert strip_console("console.warn(s);", methods=("warn",)) == "void 0;"
+
+
+@pytest.mark.parametrize(
+    "argument",
+    ['")"', "'(('", "`${a})`", "/\\)/g", "/[)]/", "a / b"],
+)
+def test_strip_console_argument_with_parentheses(argument):
+    assert strip_console(f"console.log({argument}); next();") == "void 0; next();"
+
+
+def test_strip_console_as_expression():
+    assert strip_console("ok ? console.log(1) : f()") == "ok ? void 0 : f()"
+
+
+def test_tokenize_regex_and_division():
+    assert ("regex", "/\\/\\*x/g") in tokenize("var r = /\\/\\*x/g;")
+    assert "regex" not in [kind for kind, _ in tokenize("y = a / b / c")]
+    assert [kind for kind, _ in tokenize("return /x/")] == ["word", "space", "regex"]
+
+
+def test_minify_removes_comments_and_indentation():
+    code = """
+    // comment
+    function f(a) {
+        /* block
+           comment */
+        return a + 1;
+    }
+    """
+    assert minify_js(code) == "function f(a){\nreturn a+1;\n}\n"
+
+
+def test_minify_keeps_strings_and_regex_literals():
+    code = 'var a = "  // not a comment  ";\nvar r = /\\/\\*x/g;   /* block */\nvar t = `a  /* b */`;'
+    assert minify_js(code) == (
+        'var a="  // not a comment  ";\nvar r=/\\/\\*x/g;\nvar t=`a  /* b */`;\n'
+    )
+
+
+def test_minify_keeps_required_spaces_and_line_breaks():
+    assert minify_js("var b = a + +c - -d;") == "var b=a+ +c- -d;\n"
+    # Line breaks are kept for the automatic semicolon insertion
+    assert minify_js("a = b\n(c)") == "a=b\n(c)\n"
+    assert minify_js("return\nx") == "return\nx\n"
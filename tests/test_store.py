@@ -0,0 +1,72 @@
+from lqhours.backends import assign_rowids, newer_rows, renumber_dataframe
+from lqhours.store import open_store
+
+from conftest import hours_row
+
+
+def stored_rows(store):
+    return {row["uid"]: row for row in store.dataframe()["data"]}
+
+
+def test_assign_rowids():
+    known = {"a": 0}
+    rows, next_rowid = assign_rowids(
+        [hours_row("a", rowid=-1), hours_row("b", rowid=-2), hours_row(None, rowid=5)], known, 6
+    )
+    assert [row["rowid"] for row in rows] == [0, 6, 5]
+    assert next_rowid == 7
+    assert known == {"a": 0, "b": 6}
+
+
+def test_renumber_dataframe():
+    dataframe = dict(
+        data=[hours_row("a", rowid=0), hours_row("b", rowid=-1), hours_row("c", rowid=-2)]
+    )
+    assert [row["rowid"] for row in renumber_dataframe(dataframe)["data"]] == [0, 1, 2]
+
+
+def test_new_rows_get_rowids(store):
+    written = store.apply_rows([hours_row("a", rowid=-1), hours_row("b", rowid=-1, day=2)])
+    assert [row["rowid"] for row in written] == [0, 1]
+    assert {uid: row["rowid"] for uid, row in stored_rows(store).items()} == {"a": 0, "b": 1}
+
+
+def test_uid_upsert_keeps_rowid(store):
+    store.apply_rows([hours_row("a", end=False)])
+    # The client still has its temporary rowid
+    written = store.apply_rows([hours_row("a", rowid=-1)])
+    assert written[0]["rowid"] == 0
+    rows = store.dataframe()["data"]
+    assert len(rows) == 1
+    assert rows[0]["end"] == "2026-01-01T10:00:00Z"
+
+
+def test_stores_sharing_the_data_do_not_collide(tmp_path, backend):
+    first = open_store(tmp_path, backend=backend)
+    second = open_store(tmp_path, backend=backend)
+    first.apply_rows([hours_row("a", rowid=-1)])
+    second.apply_rows([hours_row("b", rowid=-1)])
+    rows = open_store(tmp_path, backend=backend).dataframe()["data"]
+    assert sorted((row["uid"], row["rowid"]) for row in rows) == [("a", 0), ("b", 1)]
+
+
+def test_older_rows_are_refused(tmp_path, backend):
+    store = open_store(tmp_path, backend=backend)
+    store.apply_rows([hours_row("a", updated=2000)])
+    assert store.apply_rows([hours_row("a", end=False, updated=1000)]) == []
+    assert stored_rows(store)["a"]["end"] != ""
+    store.apply_rows([hours_row("a", name="B", updated=3000)])
+    assert stored_rows(store)["a"]["name"] == "B"
+    reopened = open_store(tmp_path, backend=backend)
+    assert reopened.apply_rows([hours_row("a", updated=2500)]) == []
+
+
+def test_newer_rows():
+    stored = {0: 2000}
+    rows = [
+        hours_row("a", rowid=0, updated=1000),
+        hours_row("b", rowid=1, updated=1000),
+        hours_row("c", rowid=2),
+    ]
+    assert [row["uid"] for row in newer_rows(rows, stored)] == ["b", "c"]
+    assert stored == {0: 2000, 1: 1000}